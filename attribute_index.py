@@ -0,0 +1,111 @@
+import numpy as np
+
+
+class PostingIndex:
+    """
+    Inverted index over a categorical column: for each value, the ascending ids of the rows
+    that have it, stored as one ids array plus per-value offsets.
+    separator: treat each value as a list of tags ("Beginners / Families") and index the tags.
+    """
+
+    def __init__(self, column, separator=None):
+        codes = np.asarray(column.codes)
+        n_values = len(column.values)
+
+        # Rows grouped by code; a stable sort keeps ids ascending inside each group
+        by_code = np.argsort(codes, kind="stable")
+        code_offsets = np.zeros(n_values + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=n_values), out=code_offsets[1:])
+
+        if separator is None:
+            self.values = list(column.values)
+            self.ids, self.offsets = by_code, code_offsets
+            return
+
+        # Each tag's postings are the union of the postings of every value that contains it
+        tag_codes = {}
+        for code, value in enumerate(column.values):
+            for tag in value.split(separator):
+                tag = tag.strip()
+                if tag:
+                    tag_codes.setdefault(tag, []).append(code)
+        self.values = list(tag_codes)
+        lists = [
+            np.sort(np.concatenate([by_code[code_offsets[c]:code_offsets[c + 1]] for c in codes_with_tag]))
+            for codes_with_tag in tag_codes.values()
+        ]
+        self.offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in lists], out=self.offsets[1:])
+        self.ids = np.concatenate(lists) if lists else np.empty(0, dtype=np.intp)
+
+    def postings(self, code):
+        """Ascending ids of the rows with value (or tag) number `code`."""
+        return self.ids[self.offsets[code]:self.offsets[code + 1]]
+
+    def match(self, value):
+        """
+        Codes of the indexed values a query term refers to: the case-insensitive exact match
+        if there is one, otherwise every value containing the term ("eastern" -> "Eastern Fells").
+        """
+        term = value.strip().lower()
+        exact = [code for code, v in enumerate(self.values) if v.lower() == term]
+        if exact or not term:
+            return exact
+        return [code for code, v in enumerate(self.values) if term in v.lower()]
+
+    def lookup(self, value):
+        """Ascending ids of the rows matching a query term."""
+        codes = self.match(value)
+        if len(codes) == 1:
+            return self.postings(codes[0])
+        if not codes:
+            return np.empty(0, dtype=self.ids.dtype)
+        return np.unique(np.concatenate([self.postings(code) for code in codes]))
+
+
+class SortedIndex:
+    """Numeric column sorted once, so range queries are two binary searches instead of a scan."""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(values, kind="stable")
+        order = order[~np.isnan(values[order])]  # Blank cells never match a range
+        self.ids = order
+        self.values = values[order]
+
+    def between(self, low=None, high=None):
+        """Ascending ids of rows with low <= value <= high (either bound may be None)."""
+        start = 0 if low is None else np.searchsorted(self.values, low, side="left")
+        stop = len(self.values) if high is None else np.searchsorted(self.values, high, side="right")
+        return np.sort(self.ids[start:stop])
+
+
+def intersect(id_lists):
+    """Intersection of ascending id arrays, smallest first so every step shrinks the working set."""
+    id_lists = sorted(id_lists, key=len)
+    result = id_lists[0]
+    for ids in id_lists[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, ids, assume_unique=True)
+    return result
+
+
+class PartitionedIndex:
+    """
+    Rows split into partitions by a small integer code, each partition sorted by a numeric
+    value: partition(p) returns its ids and values in ascending value order, ready to bisect.
+    """
+
+    def __init__(self, codes, values, n_partitions):
+        codes = np.asarray(codes)
+        values = np.asarray(values, dtype=np.float64)
+        order = np.lexsort((values, codes))  # By code, then value (NaN last within each code)
+        self.ids = order
+        self.values = values[order]
+        self.offsets = np.zeros(n_partitions + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=n_partitions), out=self.offsets[1:])
+
+    def partition(self, code):
+        start, stop = self.offsets[code], self.offsets[code + 1]
+        return self.ids[start:stop], self.values[start:stop]
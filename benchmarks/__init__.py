@@ -0,0 +1,8 @@
+"""
+Benchmark suite: synthetic catalogs (synthetic.py), local stand-ins for Gemini, Open-Meteo and
+Overpass (stubs.py), the runner that times everything and writes JSON results (run.py) and
+the CLI startup benchmark (startup.py).
+
+    python -m benchmarks.run --rows 1000,100000 --out .cache/bench/results.json
+    python -m benchmarks.startup --runs 10
+"""
@@ -0,0 +1,362 @@
+"""
+Benchmark runner: times catalog loading, trail search, name lookup, POI search and whole
+conversations against synthetic catalogs and the local stubs, and writes the results as JSON.
+
+    python -m benchmarks.run                                    # 1k and 100k rows, stubbed services
+    python -m benchmarks.run --rows 1000,1000000,10000000 --sessions 500 --concurrency 100
+    python -m benchmarks.run --baseline old.json --out new.json  # exit status 1 on regressions
+
+Every result is one JSON object keyed by (benchmark, rows, variant). Repeated operations
+report n, mean/p50/p95/p99/max in ms and ops_per_s; one-off operations report ms. With
+--baseline, results whose p95 (or ms) grew by more than --tolerance are listed and fail the run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+from benchmarks.stubs import Latency, StubGeminiClient, StubServer
+from benchmarks.synthetic import PLACES, REGIONS, cached_path
+from communicator_agent import CommunicationAgent
+from data_agent import DataAgent
+from planner_agent import PlannerAgent
+from poi_index import PoiIndex
+from resilience import CallGuard
+from root_agent import RootAgent
+from trail_store import DIFFICULTY_ORDER
+
+# Approximate village centres used as "near <place>" origins
+QUERY_ORIGINS = [(54.6013, -3.1347), (54.4326, -2.9627), (54.4597, -3.0244), (54.3713, -3.0747),
+                 (54.5432, -2.9514), (54.5415, -3.2973), (54.4500, -3.2130)]
+
+
+def summarize(seconds, wall=None):
+    """Latency summary (ms) of a list of durations; ops_per_s over `wall` seconds (default: their sum)."""
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    if len(values) == 0:
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    wall = wall if wall is not None else values.sum() / 1000
+    return {"n": len(values), "mean_ms": round(float(values.mean()), 4), "p50_ms": round(float(p50), 4),
+            "p95_ms": round(float(p95), 4), "p99_ms": round(float(p99), 4), "max_ms": round(float(values.max()), 4),
+            "ops_per_s": round(len(values) / wall, 2) if wall else None}
+
+
+def timed(fn, *args, **kwargs):
+    """(result, seconds) of one call."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def repeat(fn, inputs):
+    """Durations of fn(input) for each input."""
+    durations = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+class Results:
+    def __init__(self):
+        self.items = []
+
+    def add(self, benchmark, rows, variant=None, **values):
+        item = {"benchmark": benchmark, "rows": rows, "variant": variant, **values}
+        self.items.append(item)
+        headline = values.get("p95_ms", values.get("ms"))
+        suffix = f"p95 {headline:.3f} ms" if "p95_ms" in values else f"{headline:.1f} ms" if headline is not None else ""
+        print(f"  {benchmark:<24} {variant or '':<18} {suffix}", flush=True)
+
+
+# --- Catalog ---
+def bench_catalog(results, csv_path, rows, workdir, max_dict_rows):
+    """CSV parsing, snapshot build (cold) and open (warm), and the lazily built query indexes."""
+    data_agent = DataAgent(csv_path, snapshot_path=os.path.join(workdir, f"trails-{rows}.trailsnap"))
+
+    if rows <= max_dict_rows:
+        trails, seconds = timed(data_agent.load_trails)
+        results.add("load_trails", rows, ms=round(seconds * 1000, 3))
+        del trails
+    else:
+        results.add("load_trails", rows, skipped=f"over --max-dict-rows ({max_dict_rows})")
+
+    if os.path.exists(data_agent.snapshot_path):
+        os.remove(data_agent.snapshot_path)
+    _, seconds = timed(data_agent.load_trail_store)
+    results.add("load_trail_store", rows, "cold", ms=round(seconds * 1000, 3))
+    store, seconds = timed(data_agent.load_trail_store)
+    results.add("load_trail_store", rows, "warm", ms=round(seconds * 1000, 3))
+
+    for name in ("attribute_indexes", "difficulty_index", "duration_index", "name_index"):
+        _, seconds = timed(getattr, store, name)
+        results.add("index_build", rows, name, ms=round(seconds * 1000, 3))
+    return data_agent
+
+
+def bench_search(results, planner, rows, n, rng):
+    """get_trails_by_criteria as RootAgent calls it (top 50): plain, near a place and with filters."""
+    def criteria():
+        return DIFFICULTY_ORDER[rng.randrange(len(DIFFICULTY_ORDER))], rng.choice([3, 5, 8, 10, 15, 20, 30])
+
+    limit = RootAgent.MAX_RESULTS
+    variants = {
+        "plain": ([criteria() for _ in range(n)],
+                  lambda q: planner.get_trails_by_criteria(*q, limit=limit)),
+        "near_place": ([criteria() + (rng.choice(QUERY_ORIGINS),) for _ in range(n)],
+                       lambda q: planner.get_trails_by_criteria(q[0], q[1], origin=q[2], radius_km=10, limit=limit)),
+        "filtered": ([criteria() + (rng.choice(REGIONS),) for _ in range(n)],
+                     lambda q: planner.get_trails_by_criteria(q[0], q[1], limit=limit,
+                                                              filters={"region": q[2], "max_duration": 4})),
+        # Full ranking without a limit sorts the whole catalog, so fewer repetitions
+        "unlimited": ([criteria() for _ in range(max(n // 20, 5))],
+                      lambda q: planner.get_trails_by_criteria(*q, limit=None)),
+    }
+    for variant, (inputs, fn) in variants.items():
+        results.add("get_trails_by_criteria", rows, variant, **summarize(repeat(fn, inputs)))
+
+
+def bench_names(results, store, rows, n, rng):
+    """NameIndex.search for exact names, word prefixes and typos of real catalog names."""
+    names = [store[rng.randrange(len(store))]["Trail"] for _ in range(n)]
+
+    def typo(name):
+        i = rng.randrange(1, len(name) - 1)
+        return name[:i] + name[i + 1:]
+
+    variants = {
+        "exact": names,
+        "prefix": [" ".join(name.split()[:2]) for name in names],
+        "suffix_words": [" ".join(name.split()[-2:]) for name in names],
+        "typo": [typo(name.split(" from ")[0]) for name in names],
+    }
+    for variant, queries in variants.items():
+        results.add("name_lookup", rows, variant, **summarize(repeat(store.name_index.search, queries)))
+
+
+def bench_pois(results, poi_path, n_pois, n, rng, server):
+    """Offline PoiIndex radius search, plus the live Overpass path against the stub."""
+    index, seconds = timed(PoiIndex.from_file, poi_path)
+    results.add("poi_load", n_pois, ms=round(seconds * 1000, 3))
+    points = [(rng.uniform(54.3, 54.7), rng.uniform(-3.4, -2.8), rng.choice(["pub", "cafe"])) for _ in range(n)]
+    for radius in (2, 5, 20):
+        durations = repeat(lambda p: index.nearby(p[0], p[1], p[2], radius_km=radius, k=10), points)
+        results.add("poi_search", n_pois, f"index_r{radius}km", **summarize(durations))
+
+    overpass = CommunicationAgent(poi_path=None)
+    overpass.OVERPASS_URL = server.overpass_url
+    durations = repeat(lambda p: overpass.get_nearby_pubs_cafes(p[0], p[1], place_type=p[2]),
+                       points[:max(n // 50, 10)])
+    results.add("poi_search", n_pois, "overpass_stub", **summarize(durations))
+
+
+# --- Conversations ---
+def conversation(rng):
+    """One scripted conversation, as a list of user messages."""
+    difficulty = DIFFICULTY_ORDER[rng.randrange(len(DIFFICULTY_ORDER))]
+    distance = rng.choice([5, 8, 10, 12, 15, 20])
+    pick = str(rng.randint(1, 3))
+    amenity = rng.choice(["pub", "cafe"])
+    if rng.random() < 0.5:
+        return ["", difficulty, str(distance), pick, "yes", "yes", amenity]
+    # The whole request in one message, including the amenity
+    return ["", f"{difficulty} walk under {distance}km near {rng.choice(PLACES)} with a {amenity}",
+            pick, "yes", "yes"]
+
+
+def make_template(data_agent, planner, server, gemini, poi_path, guard_workers, prefetch):
+    data_agent.WEATHER_URL = server.weather_url
+    communicator = CommunicationAgent(poi_path=poi_path)
+    communicator.OVERPASS_URL = server.overpass_url
+    guard = CallGuard(timeout=8.0, max_workers=guard_workers) if guard_workers else None
+    return RootAgent(planner, data_agent, communicator, client=gemini, gemini_guard=guard,
+                     prefetch_top_n=prefetch)
+
+
+def bench_conversations(results, template, rows, sessions, concurrency, rng):
+    """Sessions forked from one template, run `concurrency` at a time on threads (as session_server does)."""
+    scripts = [conversation(rng) for _ in range(sessions)]
+    turns, completed = [], []
+
+    def run(script):
+        session = template.fork()
+        start = time.perf_counter()
+        for message in script:
+            _, seconds = timed(lambda: "".join(session.handle_user_message(message, stream=True)))
+            turns.append(seconds)
+        completed.append(session.state["awaiting_input"] is None)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        durations = list(pool.map(run, scripts))
+    wall = time.perf_counter() - start
+    results.add("conversation", rows, f"sync_c{concurrency}", **summarize(durations, wall),
+                completed=sum(completed), turns=summarize(turns, wall))
+
+
+def bench_conversations_async(results, template, rows, sessions, concurrency, rng):
+    """The same conversations on one event loop through handle_user_message_async."""
+    import httpx
+
+    scripts = [conversation(rng) for _ in range(sessions)]
+    turns, completed = [], []
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as http:
+            async def run(script):
+                async with limit:
+                    session = template.fork()
+                    start = time.perf_counter()
+                    for message in script:
+                        turn_start = time.perf_counter()
+                        await session.handle_user_message_async(message, http)
+                        turns.append(time.perf_counter() - turn_start)
+                    completed.append(session.state["awaiting_input"] is None)
+                    return time.perf_counter() - start
+            return await asyncio.gather(*(run(script) for script in scripts))
+
+    start = time.perf_counter()
+    durations = asyncio.run(main())
+    wall = time.perf_counter() - start
+    results.add("conversation", rows, f"async_c{concurrency}", **summarize(durations, wall),
+                completed=sum(completed), turns=summarize(turns, wall))
+
+
+# --- Results ---
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(current, baseline, tolerance):
+    """Results that got slower than baseline by more than tolerance (a fraction), as readable lines."""
+    def key(item):
+        return item["benchmark"], item["rows"], item["variant"]
+
+    previous = {key(item): item for item in baseline["results"]}
+    regressions = []
+    for item in current:
+        old = previous.get(key(item))
+        if old is None:
+            continue
+        field = "p95_ms" if "p95_ms" in item else "ms"
+        if field not in item or field not in old:
+            continue
+        # Ignore sub-50µs differences, which are timer noise rather than regressions
+        if item[field] > old[field] * (1 + tolerance) and item[field] - old[field] > 0.05:
+            regressions.append(f"{item['benchmark']} rows={item['rows']} {item['variant'] or ''}: "
+                               f"{field} {old[field]} -> {item[field]}")
+    return regressions
+
+
+def main():
+    logging.basicConfig(level=logging.ERROR, format="%(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Benchmark Trail Buddy against synthetic catalogs and stubbed services.")
+    parser.add_argument("--rows", default="1000,100000", help="comma-separated catalog sizes")
+    parser.add_argument("--pois", type=int, default=None, help="POI count (default: rows / 10, at least 1000)")
+    parser.add_argument("--queries", type=int, default=1000, help="repetitions per search / lookup benchmark")
+    parser.add_argument("--sessions", type=int, default=200, help="conversations per conversation benchmark")
+    parser.add_argument("--concurrency", type=int, default=50, help="conversations in flight at once")
+    parser.add_argument("--gemini-latency", type=float, default=0.4, help="median Gemini latency (s)")
+    parser.add_argument("--weather-latency", type=float, default=0.05, help="median Open-Meteo latency (s)")
+    parser.add_argument("--overpass-latency", type=float, default=0.2, help="median Overpass latency (s)")
+    parser.add_argument("--sigma", type=float, default=0.4, help="lognormal spread of every stub's latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    parser.add_argument("--poi-source", choices=("overpass", "index"), default="overpass",
+                        help="where conversations look up pubs/cafes")
+    parser.add_argument("--guard-workers", type=int, default=None,
+                        help="Gemini CallGuard thread pool size (default: RootAgent's)")
+    parser.add_argument("--prefetch", type=int, default=0, help="RootAgent prefetch_top_n")
+    parser.add_argument("--max-dict-rows", type=int, default=1_000_000,
+                        help="skip load_trails (a list of dicts) above this many rows")
+    parser.add_argument("--skip", default="", help="comma-separated benchmarks to skip, e.g. conversation")
+    parser.add_argument("--trace", action="store_true", help="enable metrics and include span histograms")
+    parser.add_argument("--workdir", default=os.path.join(".cache", "bench"), help="generated data and snapshots")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="results file (default: WORKDIR/results-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    skip = set(filter(None, args.skip.split(",")))
+    metrics.enable(args.trace)
+    rng = random.Random(args.seed)
+    results = Results()
+    spans = {}
+
+    server = StubServer(weather=Latency(args.weather_latency, args.sigma, args.error_rate, seed=args.seed),
+                        overpass=Latency(args.overpass_latency, args.sigma, args.error_rate, seed=args.seed + 1),
+                        seed=args.seed).start()
+    try:
+        for rows in (int(r) for r in args.rows.split(",")):
+            print(f"rows={rows}", flush=True)
+            n_pois = args.pois or max(rows // 10, 1000)
+            csv_path = cached_path(args.workdir, "trails", rows, args.seed)
+            poi_path = cached_path(args.workdir, "pois", n_pois, args.seed)
+            metrics.REGISTRY.reset()
+
+            if "catalog" in skip:
+                data_agent = DataAgent(csv_path, snapshot_path=os.path.join(args.workdir, f"trails-{rows}.trailsnap"))
+            else:
+                data_agent = bench_catalog(results, csv_path, rows, args.workdir, args.max_dict_rows)
+            planner = PlannerAgent(data_agent)
+
+            if "search" not in skip:
+                bench_search(results, planner, rows, args.queries, rng)
+            if "names" not in skip:
+                bench_names(results, planner.store, rows, args.queries, rng)
+            if "pois" not in skip:
+                bench_pois(results, poi_path, n_pois, args.queries, rng, server)
+            if "conversation" not in skip:
+                gemini = StubGeminiClient(Latency(args.gemini_latency, args.sigma, args.error_rate, seed=args.seed + 2))
+                template = make_template(data_agent, planner, server, gemini,
+                                         poi_path if args.poi_source == "index" else None,
+                                         args.guard_workers, args.prefetch)
+                bench_conversations(results, template, rows, args.sessions, args.concurrency, rng)
+                bench_conversations_async(results, template, rows, args.sessions, args.concurrency, rng)
+
+            if args.trace:
+                spans[rows] = metrics.snapshot()["histograms"]
+    finally:
+        server.stop()
+
+    output = {"environment": environment(), "arguments": vars(args), "results": results.items}
+    if args.trace:
+        output["spans"] = spans
+    out = args.out or os.path.join(args.workdir, f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Wrote {len(results.items)} results to {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results.items, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+CLI startup benchmark: launches main.py eagerly (TRAIL_BUDDY_LAZY=0) and lazily and times how
+long the greeting takes to appear, then how long the first search takes to answer when typed
+straight away and after a short pause (by which time lazy mode has warmed up).
+
+    python -m benchmarks.startup --runs 10 --out .cache/bench/startup.json
+
+Uses the real main.py, so a GEMINI_API_KEY is needed in the environment or .env (any value
+works: no Gemini call is on the measured path).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.run import Results, compare, environment, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _read_reply(process):
+    """Block until the next agent reply line; returns when it started arriving."""
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("main.py exited before replying")
+        if "Agent:" in line:
+            return time.perf_counter()
+
+
+def run_once(lazy, pause, query):
+    """(seconds to greeting, seconds to first search reply) for one launch of main.py."""
+    env = dict(os.environ, TRAIL_BUDDY_LAZY="1" if lazy else "0", PYTHONUNBUFFERED="1")
+    env.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env, text=True, encoding="utf-8",
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        greeting = _read_reply(process) - start
+        time.sleep(pause)
+        sent = time.perf_counter()
+        process.stdin.write(query + "\n")
+        process.stdin.flush()
+        first_search = _read_reply(process) - sent
+        process.communicate("exit\n", timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return greeting, first_search
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time main.py's greeting and first search, eager vs lazy.")
+    parser.add_argument("--runs", type=int, default=5, help="launches per mode and pause")
+    parser.add_argument("--pauses", default="0,1", help="comma-separated seconds to wait before the first search")
+    parser.add_argument("--query", default="moderate walk under 8km")
+    parser.add_argument("--out", default=os.path.join(".cache", "bench", "startup.json"))
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = Results()
+    for mode, lazy in (("eager", False), ("lazy", True)):
+        for pause in (float(p) for p in args.pauses.split(",")):
+            greetings, searches = [], []
+            for _ in range(args.runs):
+                greeting, first_search = run_once(lazy, pause, args.query)
+                greetings.append(greeting)
+                searches.append(first_search)
+            results.add("startup_greeting", None, f"{mode}_pause{pause:g}s", **summarize(greetings))
+            results.add("startup_first_search", None, f"{mode}_pause{pause:g}s", **summarize(searches))
+
+    output = {"environment": environment(), "arguments": vars(args), "results": results.items}
+    if os.path.dirname(args.out):
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Wrote {len(results.items)} results to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results.items, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
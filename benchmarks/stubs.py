@@ -0,0 +1,238 @@
+"""
+Local stand-ins for the external services, with configurable latency, so benchmarks measure
+this code rather than the network or API quotas.
+
+StubServer is a real HTTP server on 127.0.0.1 speaking just enough of the Open-Meteo and
+Overpass APIs for DataAgent and CommunicationAgent (point them at it with WEATHER_URL /
+OVERPASS_URL). StubGeminiClient replaces genai.Client in-process: generate_content,
+generate_content_stream and aio.models.generate_content, with usage_metadata.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+
+class Latency:
+    """
+    Lognormal latency with the given median (seconds); sigma widens the tail
+    (0 = constant, 0.5 puts p99 at about 3.2x the median).
+    error_rate: fraction of calls that fail instead of answering. `calls` counts samples taken.
+    """
+
+    def __init__(self, median=0.0, sigma=0.0, error_rate=0.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """(seconds to wait, whether this call fails)."""
+        with self._lock:
+            self.calls += 1
+            seconds = self.median * self._random.lognormvariate(0, self.sigma) if self.sigma else self.median
+            return seconds, self._random.random() < self.error_rate
+
+
+# --- Open-Meteo and Overpass ---
+_AROUND = re.compile(r"around:([\d.]+),(-?[\d.]+),(-?[\d.]+)")
+_AMENITY = re.compile(r'"amenity"="(\w+)"')
+
+
+class _ThreadingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # The default backlog of 5 refuses connections under load
+
+
+class StubServer:
+    """
+    Open-Meteo (GET /v1/forecast, including comma-separated bulk requests) and Overpass
+    (GET or POST /api/interpreter with an `around:` query) on one local port.
+
+        with StubServer(weather=Latency(0.05), overpass=Latency(0.2)) as server:
+            data_agent.WEATHER_URL = server.weather_url
+            communicator_agent.OVERPASS_URL = server.overpass_url
+    """
+
+    def __init__(self, weather=None, overpass=None, pois_per_query=20, seed=0):
+        self.weather = weather or Latency()
+        self.overpass = overpass or Latency()
+        self.pois_per_query = pois_per_query
+        self.seed = seed
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def weather_url(self):
+        return self.url + "/v1/forecast"
+
+    @property
+    def overpass_url(self):
+        return self.url + "/api/interpreter"
+
+    def start(self):
+        self._server = _ThreadingServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    @staticmethod
+    def _weather(lat, lon):
+        # Deterministic per location, so cached and fresh answers agree
+        rng = random.Random(f"{lat:.3f},{lon:.3f}")
+        return {"latitude": lat, "longitude": lon, "current_weather": {
+            "temperature": round(rng.uniform(-2, 22), 1), "windspeed": round(rng.uniform(0, 60), 1),
+            "weathercode": rng.choice([0, 1, 2, 3, 45, 61, 63, 80, 95])}}
+
+    def _pois(self, query):
+        around, amenity = _AROUND.search(query), _AMENITY.search(query)
+        if not around:
+            return {"elements": []}
+        radius_m, lat, lng = (float(v) for v in around.groups())
+        amenity = amenity.group(1) if amenity else "cafe"
+        rng = random.Random(f"{self.seed}:{query}")
+        deg = radius_m / 111_000
+        return {"elements": [
+            {"type": "node", "id": i, "lat": lat + rng.uniform(-deg, deg) * 0.7,
+             "lon": lng + rng.uniform(-deg, deg) * 0.7,
+             "tags": {"amenity": amenity, "name": f"Stub {amenity.title()} {i}"}}
+            for i in range(self.pois_per_query)
+        ]}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, as with the real APIs
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _serve(self, params):
+                path = urlparse(self.path).path
+                if path == "/v1/forecast":
+                    kind, latency = "weather", stub.weather
+                elif path == "/api/interpreter":
+                    kind, latency = "overpass", stub.overpass
+                else:
+                    return self._send(404, {"error": "not found"})
+                seconds, fail = latency.sample()
+                time.sleep(seconds)
+                if fail:
+                    return self._send(503, {"error": "stub failure"})
+
+                if kind == "overpass":
+                    return self._send(200, stub._pois(params.get("data", [""])[0]))
+                lats = [float(v) for v in params.get("latitude", ["0"])[0].split(",")]
+                lons = [float(v) for v in params.get("longitude", ["0"])[0].split(",")]
+                results = [stub._weather(lat, lon) for lat, lon in zip(lats, lons)]
+                self._send(200, results[0] if len(results) == 1 else results)
+
+            def do_GET(self):
+                self._serve(parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self._serve(parse_qs(self.rfile.read(length).decode("utf-8")))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+# --- Gemini ---
+class StubGeminiError(RuntimeError):
+    """Injected Gemini failure."""
+
+
+def _response(text, prompt=""):
+    usage = SimpleNamespace(prompt_token_count=max(len(prompt) // 4, 1), candidates_token_count=len(text) // 4)
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class _Models:
+    def __init__(self, client):
+        self.client = client
+
+    def generate_content(self, model, contents, config=None):
+        seconds, fail = self.client.latency.sample()
+        time.sleep(seconds)
+        if fail:
+            raise StubGeminiError("stub failure")
+        return _response(self.client.reply(contents), contents)
+
+    def generate_content_stream(self, model, contents, config=None):
+        """Time to first chunk is the sampled latency; the rest arrive chunk_interval apart."""
+        seconds, fail = self.client.latency.sample()
+        time.sleep(seconds)
+        if fail:
+            raise StubGeminiError("stub failure")
+        words = self.client.reply(contents).split(" ")
+        size = max(len(words) // self.client.stream_chunks, 1)
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self.client.chunk_interval)
+            # Like the real API, the last chunk's usage_metadata carries the totals
+            yield _response(chunk, contents) if i == len(chunks) - 1 else SimpleNamespace(text=chunk, usage_metadata=None)
+
+
+class _AsyncModels:
+    def __init__(self, client):
+        self.client = client
+
+    async def generate_content(self, model, contents, config=None):
+        seconds, fail = self.client.latency.sample()
+        await asyncio.sleep(seconds)
+        if fail:
+            raise StubGeminiError("stub failure")
+        return _response(self.client.reply(contents), contents)
+
+
+class StubGeminiClient:
+    """Drop-in for genai.Client (RootAgent(client=...)) that answers after a sampled latency."""
+
+    def __init__(self, latency=None, stream_chunks=5, chunk_interval=0.02, words=60):
+        self.latency = latency or Latency()
+        self.stream_chunks = stream_chunks
+        self.chunk_interval = chunk_interval
+        self.words = words
+        self.models = _Models(self)
+        self.aio = SimpleNamespace(models=_AsyncModels(self))
+
+    @property
+    def calls(self):
+        return self.latency.calls
+
+    def reply(self, prompt):
+        first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+        return " ".join([f"Stub reply to '{first_line[:40]}'."] + ["lorem"] * self.words)
@@ -0,0 +1,156 @@
+"""
+Synthetic Lake District-style catalogs of any size, in the same CSV layouts as
+data/lake_district_trails.csv and the offline POI extract (poi_index.py).
+
+    python -m benchmarks.synthetic trails 1000000 .cache/bench/trails-1000000.csv
+    python -m benchmarks.synthetic pois 100000 .cache/bench/pois-100000.csv
+
+Rows are generated in vectorized chunks and written as they go, so 10M rows need no more
+memory than one chunk. Output depends only on (rows, seed).
+"""
+import csv
+import os
+import sys
+
+import numpy as np
+
+from trail_store import DIFFICULTY_ORDER
+
+TRAIL_COLUMNS = ["Trail", "Difficulty", "Distance_km", "Lat", "Lng", "Duration_hours", "Starting_Point",
+                 "Difficulty_Reason", "Route", "Views", "Fell_Height_ft", "Fell_Classification", "Region",
+                 "Suitable_For"]
+
+# Rough bounding box of the Lake District
+SOUTH, WEST, NORTH, EAST = 54.2, -3.6, 54.8, -2.6
+
+FELLS = ["Helvellyn", "Skiddaw", "Blencathra", "Scafell Pike", "Great Gable", "Catbells", "Fairfield",
+         "Coniston Old Man", "Haystacks", "Grisedale Pike", "Pavey Ark", "Harrison Stickle", "Loughrigg Fell",
+         "High Street", "Red Screes", "Place Fell", "Hallin Fell", "Grasmoor", "Pillar", "Bowfell",
+         "Crinkle Crags", "Dale Head", "Robinson", "Causey Pike", "St Sunday Crag", "Wetherlam", "Latrigg",
+         "Walla Crag", "Silver How", "Helm Crag", "High Stile", "Red Pike", "Kirk Fell", "Yewbarrow",
+         "Great Mell Fell", "Gowbarrow Fell", "Barf", "Lord's Seat", "Whinlatter", "Binsey", "Black Combe",
+         "Harter Fell", "Wansfell", "Troutbeck Tongue", "Caw", "Hard Knott", "Glaramara", "Seathwaite Fell"]
+ROUTES = ["via Striding Edge", "via Swirral Edge", "from the north", "from the south", "horseshoe",
+          "circular", "by the old corpse road", "via the tarn", "ridge walk", "via the valley path",
+          "direct ascent", "from the pass", "via Sharp Edge", "by the lakeshore", "round"]
+PLACES = ["Keswick", "Ambleside", "Grasmere", "Coniston", "Glenridding", "Patterdale", "Buttermere",
+          "Borrowdale", "Seatoller", "Wasdale Head", "Langdale", "Elterwater", "Troutbeck", "Windermere",
+          "Hawkshead", "Braithwaite", "Threlkeld", "Pooley Bridge", "Eskdale", "Ennerdale Bridge",
+          "Caldbeck", "Bassenthwaite", "Portinscale", "Rosthwaite", "Dockray", "Mardale Head", "Kentmere",
+          "Staveley", "Broughton Mills", "Loweswater"]
+REGIONS = ["Eastern Fells", "Far Eastern Fells", "Central Fells", "Southern Fells", "Northern Fells",
+           "North Western Fells", "Western Fells", "Skiddaw Group"]
+CLASSIFICATIONS = ["Wainwright", "Wainwright / Hewitt", "Wainwright / Nuttall", "Birkett", "Outlying Fell",
+                   "Hewitt / Nuttall", ""]
+SUITABLE_FOR = ["Beginners / Families", "Beginners / Casual walkers", "Casual walkers",
+                "Experienced hikers", "Experienced hikers / Scramblers", "Families / Dog walkers",
+                "Fit walkers"]
+REASONS = ["Gentle slopes", "Steady climb", "Steep in places", "Rough ground and scrambling",
+           "Long day with big ascent"]
+VIEWS = ["Views over Derwentwater", "Panorama of the central fells", "Views to the Scafell range",
+         "Lake views", "Views over Ullswater", "Sweeping views to the coast"]
+
+AMENITIES = ["pub", "cafe", "restaurant", "parking"]
+AMENITY_WEIGHTS = [0.35, 0.35, 0.2, 0.1]
+POI_NAMES = ["The Old Inn", "Fellside Cafe", "The Golden Rule", "Tea Rooms", "The Kirkstile", "Lakeside Kitchen",
+             "The Swan", "The Drovers Rest", "Mountain Coffee", "The Packhorse"]
+
+NAME_COMBINATIONS = len(FELLS) * len(ROUTES) * len(PLACES)
+NAME_STRIDE = 7919  # Prime not dividing NAME_COMBINATIONS
+CHUNK = 100_000
+
+
+def _trail_chunk(rng, start, n):
+    """Rows start..start+n-1 as a list of CSV rows."""
+    difficulty = rng.choice(len(DIFFICULTY_ORDER), size=n, p=[0.1, 0.25, 0.3, 0.25, 0.1])
+    # Harder trails run longer; lognormal keeps a long tail of big days out
+    distance = np.clip(rng.lognormal(np.log(4 + 3 * difficulty), 0.4), 1.0, 45.0).round(1)
+    duration = (distance / rng.uniform(2.5, 4.0, size=n) + 0.3 * difficulty).round(1)
+    lat = rng.uniform(SOUTH, NORTH, size=n).round(5)
+    lng = rng.uniform(WEST, EAST, size=n).round(5)
+    height = (rng.uniform(800, 1600, size=n) + 400 * difficulty).astype(int)
+
+    # Row number -> (fell, route, start point) combination via a fixed stride coprime to their count,
+    # so consecutive rows differ and every combination is used once before any name repeats
+    number = np.arange(start, start + n)
+    combo = (number * NAME_STRIDE) % NAME_COMBINATIONS
+    fell = combo // (len(ROUTES) * len(PLACES))
+    route = combo // len(PLACES) % len(ROUTES)
+    place = combo % len(PLACES)
+    repeat = number // NAME_COMBINATIONS
+    region = rng.integers(len(REGIONS), size=n)
+    classification = rng.integers(len(CLASSIFICATIONS), size=n)
+    suitable = np.minimum(difficulty + rng.integers(0, 3, size=n), len(SUITABLE_FOR) - 1)
+    views = rng.integers(len(VIEWS), size=n)
+    # Plain Python values: indexing numpy arrays element by element is several times slower
+    (difficulty, distance, duration, lat, lng, height, fell, route, place, repeat, region, classification,
+     suitable, views) = (
+        a.tolist() for a in (difficulty, distance, duration, lat, lng, height, fell, route, place, repeat, region,
+                             classification, suitable, views)
+    )
+
+    rows = []
+    for i in range(n):
+        name = f"{FELLS[fell[i]]} {ROUTES[route[i]]} from {PLACES[place[i]]}"
+        if repeat[i]:
+            name = f"{name} {repeat[i] + 1}"  # Numbered variants keep names unique past NAME_COMBINATIONS rows
+        rows.append((
+            name, DIFFICULTY_ORDER[difficulty[i]].title(), distance[i], lat[i], lng[i], duration[i],
+            PLACES[place[i]], REASONS[difficulty[i]], f"Up {ROUTES[route[i]]}, return the same way",
+            VIEWS[views[i]], height[i], CLASSIFICATIONS[classification[i]], REGIONS[region[i]],
+            SUITABLE_FOR[suitable[i]],
+        ))
+    return rows
+
+
+def write_trails(path, rows, seed=0):
+    """Write a synthetic trail CSV with `rows` rows to path; returns path."""
+    rng = np.random.default_rng(seed)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(TRAIL_COLUMNS)
+        for start in range(0, rows, CHUNK):
+            writer.writerows(_trail_chunk(rng, start, min(CHUNK, rows - start)))
+    return path
+
+
+def write_pois(path, rows, seed=0):
+    """Write a synthetic POI extract (name, amenity, lat, lng) with `rows` rows to path; returns path."""
+    rng = np.random.default_rng(seed + 1)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "amenity", "lat", "lng"])
+        for start in range(0, rows, CHUNK):
+            n = min(CHUNK, rows - start)
+            amenity = rng.choice(len(AMENITIES), size=n, p=AMENITY_WEIGHTS)
+            name = rng.integers(len(POI_NAMES), size=n).tolist()
+            amenity = amenity.tolist()
+            lat = rng.uniform(SOUTH, NORTH, size=n).round(5).tolist()
+            lng = rng.uniform(WEST, EAST, size=n).round(5).tolist()
+            writer.writerows(
+                (POI_NAMES[name[i]], AMENITIES[amenity[i]], lat[i], lng[i]) for i in range(n)
+            )
+    return path
+
+
+def cached_path(directory, kind, rows, seed=0):
+    """Path of a generated file in directory, generating it first if it isn't there yet."""
+    path = os.path.join(directory, f"{kind}-{rows}-s{seed}.csv")
+    if not os.path.exists(path):
+        partial = path + ".partial"  # Never leave a truncated file under the final name
+        (write_trails if kind == "trails" else write_pois)(partial, rows, seed)
+        os.replace(partial, path)
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5) or sys.argv[1] not in ("trails", "pois"):
+        sys.exit("Usage: python -m benchmarks.synthetic trails|pois ROWS OUTPUT.csv [SEED]")
+    kind, rows, output = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    seed = int(sys.argv[4]) if len(sys.argv) == 5 else 0
+    (write_trails if kind == "trails" else write_pois)(output, rows, seed)
+    print(f"Wrote {rows} {kind} to {output}")
@@ -1,9 +1,57 @@
-import requests
+import os
 import math
+import logging
+import metrics
+from lazy import Lazy
+from poi_index import LAKE_DISTRICT_BBOX, OVERPASS_URL, PoiIndex, parse_overpass_elements
+
+logger = logging.getLogger(__name__)
 
 class CommunicationAgent:
     """Format responses for the user and fetch external data like nearby pubs/cafes using OSM."""
 
+    OVERPASS_URL = OVERPASS_URL
+
+    def __init__(self, poi_path="data/osm_pois.csv", poi_bbox=LAKE_DISTRICT_BBOX, lazy=False):
+        """
+        poi_bbox: (south, west, north, east) to download the POI extract for when poi_path doesn't
+        exist yet; None leaves it missing.
+        lazy: load (or first download) the POI extract on first use instead of here.
+        """
+        # Offline POI extract (see poi_index.py); falls back to live Overpass queries when missing
+        self.poi_path = poi_path
+        self.poi_bbox = poi_bbox
+        self._poi_index = Lazy(self._load_poi_index)
+        if not lazy:
+            self._poi_index.get()
+
+    def _load_poi_index(self):
+        if not self.poi_path:
+            return None
+        if os.path.exists(self.poi_path):
+            return PoiIndex.from_file(self.poi_path)
+        if self.poi_bbox is None:
+            return None
+        return self._download_poi_index()
+
+    def _download_poi_index(self):
+        """First run: fetch the extract for poi_bbox once and save it, so later lookups stay offline."""
+        import requests  # Deferred: only the first run talks to Overpass here
+
+        try:
+            with metrics.span("poi_extract", source="overpass"):
+                index = PoiIndex.from_overpass(*self.poi_bbox, timeout=60)
+        except (requests.RequestException, ValueError) as e:
+            metrics.count("upstream_errors_total", service="overpass")
+            logger.warning("Could not download the POI extract, using live Overpass queries: %s", e)
+            return None
+        index.save(self.poi_path)
+        return index
+
+    @property
+    def poi_index(self):
+        return self._poi_index.get()
+
     def format_definition(self, definition):
         return f"{definition} Would you like to select this difficulty?"
 
@@ -17,44 +65,73 @@ class CommunicationAgent:
         a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
         return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-    def get_nearby_pubs_cafes(self, lat, lng, place_type="cafe", radius_km=5):
+    def get_nearby_pubs_cafes(self, lat, lng, place_type="cafe", radius_km=5, limit=None):
         """
-        Fetch nearby pubs or cafes using OpenStreetMap / Overpass API.
-        Returns a list of dicts with name and distance.
+        Find nearby pubs or cafes, from the offline POI index when one is loaded,
+        otherwise from OpenStreetMap / Overpass API.
+        Returns a list of dicts with name and distance, nearest first.
         place_type: "pub" or "cafe"
-        radius_km: search radius in km
+        radius_km: search radius in km (a true great-circle radius, not a box)
+        limit: optional maximum number of results
         """
         # Validate place type
         if place_type not in ["pub", "cafe"]:
             raise ValueError("place_type must be 'pub' or 'cafe'.")
 
-        # Convert radius to degrees (approx)
-        delta_deg = radius_km / 111  # 1 deg ~ 111 km
-        south, north = lat - delta_deg, lat + delta_deg
-        west, east = lng - delta_deg, lng + delta_deg
+        if self.poi_index is not None:
+            with metrics.span("places", source="index"):
+                return self.poi_index.nearby(lat, lng, place_type, radius_km=radius_km, k=limit)
+
+        import requests  # Deferred: the offline index needs no HTTP client
+
+        try:
+            with metrics.span("places", source="overpass"):
+                response = requests.get(self.OVERPASS_URL, params={"data": self._overpass_query(lat, lng, place_type, radius_km)},
+                                        timeout=30)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:  # Timeouts, dropped connections, non-200s, bad JSON
+            metrics.count("upstream_errors_total", service="overpass")
+            logger.warning("Overpass error: %s", e)
+            return []
+        return self._rank_overpass_results(data, lat, lng, place_type, radius_km, limit)
+
+    async def get_nearby_pubs_cafes_async(self, lat, lng, http, place_type="cafe", radius_km=5, limit=None):
+        """Async get_nearby_pubs_cafes on a shared httpx.AsyncClient (the offline index needs no I/O)."""
+        if place_type not in ["pub", "cafe"]:
+            raise ValueError("place_type must be 'pub' or 'cafe'.")
+
+        if self.poi_index is not None:
+            with metrics.span("places", source="index"):
+                return self.poi_index.nearby(lat, lng, place_type, radius_km=radius_km, k=limit)
+
+        import httpx  # Deferred like requests above; the caller's client has loaded it already
+
+        try:
+            with metrics.span("places", source="overpass"):
+                response = await http.get(self.OVERPASS_URL, params={"data": self._overpass_query(lat, lng, place_type, radius_km)},
+                                          timeout=30)
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            metrics.count("upstream_errors_total", service="overpass")
+            logger.warning("Overpass error: %s", e)
+            return []
+        return self._rank_overpass_results(data, lat, lng, place_type, radius_km, limit)
 
-        # Overpass API query
-        overpass_url = "https://overpass-api.de/api/interpreter"
-        query = f"""
+    @staticmethod
+    def _overpass_query(lat, lng, place_type, radius_km):
+        # Overpass API query (radius search done server-side with `around`)
+        return f"""
         [out:json];
         node
           ["amenity"="{place_type}"]
-          ({south},{west},{north},{east});
+          (around:{radius_km * 1000},{lat},{lng});
         out;
         """
-        response = requests.get(overpass_url, params={"data": query})
-        if response.status_code != 200:
-            return []
 
-        data = response.json()
-        results = []
-
-        for elem in data.get("elements", []):
-            name = elem.get("tags", {}).get("name", "Unnamed")
-            elem_lat = elem.get("lat")
-            elem_lng = elem.get("lon")
-            distance = round(self.haversine(lat, lng, elem_lat, elem_lng), 2)
-            results.append({"name": name, "distance_km": distance})
-
-        # Sort by distance
-        return sorted(results, key=lambda x: x["distance_km"])
+    @staticmethod
+    def _rank_overpass_results(data, lat, lng, place_type, radius_km, limit):
+        # Index the returned elements so distances are computed in one vectorized pass
+        results = PoiIndex(parse_overpass_elements(data.get("elements", [])))
+        return results.nearby(lat, lng, place_type, radius_km=radius_km, k=limit)
@@ -1,5 +1,14 @@
 import csv
-import requests
+import hashlib
+import logging
+import os
+import metrics
+from lazy import Lazy
+from trail_snapshot import load_snapshot
+from trail_store import TrailStore
+from weather_cache import WeatherCache
+
+logger = logging.getLogger(__name__)
 
 class DataAgent:
     """Fetch trail data, provide difficulty definitions, and weather info."""
@@ -13,25 +22,60 @@ class DataAgent:
         "very hard": "Very hard trails are long, steep, or rugged, requiring excellent fitness, navigation skills, and proper gear. Not recommended for beginners — only experienced hikers should attempt these routes."
     }
 
-    def __init__(self, csv_path="data/lake_district_trails.csv"):
+    WEATHER_URL = "https://api.open-meteo.com/v1/forecast"
+
+    def __init__(self, csv_path="data/lake_district_trails.csv", weather_ttl=600, weather_grid_deg=0.05,
+                 weather_timeout=5, snapshot_path=None):
         self.csv_path = csv_path
+        # Compiled memory-mapped copy of the CSV, rebuilt whenever the CSV changes
+        if snapshot_path is None:
+            stem = os.path.splitext(os.path.basename(csv_path))[0]
+            tag = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()[:8]
+            snapshot_path = os.path.join(".cache", f"{stem}-{tag}.trailsnap")
+        self.snapshot_path = snapshot_path
 
-    def load_trails(self):
-        trails = []
+        # Pooled HTTP session (created on first request) plus a snapped-grid cache in front of Open-Meteo
+        self._session = Lazy(self._new_session)
+        self.weather_timeout = weather_timeout
+        self.weather_cache = WeatherCache(self._fetch_weather, grid_deg=weather_grid_deg, ttl=weather_ttl)
+
+    @staticmethod
+    def _new_session():
+        import requests  # Deferred: only needed once weather is requested
+        return requests.Session()
+
+    @property
+    def session(self):
+        return self._session.get()
+
+    def iter_trails(self):
+        """Stream trail rows from the CSV one at a time."""
         with open(self.csv_path, newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             for row in reader:
-                trails.append({
+                yield {
                     "Trail": row["Trail"],
                     "Difficulty": row["Difficulty"].lower(),
                     "Distance_km": float(row["Distance_km"]),
                     "Lat": float(row["Lat"]),
                     "Lng": float(row["Lng"]),
+                    "Duration_hours": row.get("Duration_hours", ""),
                     "Views": row.get("Views", ""),
                     "Fell_Height": row.get("Fell_Height_ft", ""),
-                    "Route": row.get("Route", "")
-                })
-        return trails
+                    "Route": row.get("Route", ""),
+                    "Fell_Classification": row.get("Fell_Classification", ""),
+                    "Region": row.get("Region", ""),
+                    "Starting_Point": row.get("Starting_Point", ""),
+                    "Suitable_For": row.get("Suitable_For", "")
+                }
+
+    def load_trails(self):
+        return list(self.iter_trails())
+
+    def load_trail_store(self):
+        """Open the trail catalog as a columnar TrailStore, from its snapshot when it is up to date."""
+        with metrics.span("catalog_load"):
+            return load_snapshot(self.csv_path, self.snapshot_path, lambda: TrailStore(self.iter_trails()))
 
     # 🔹 Difficulty descriptions
     def get_difficulty_definition(self, difficulty):
@@ -39,13 +83,72 @@ class DataAgent:
 
     # 🔹 Weather fetching
     def get_weather(self, lat, lon):
+        """
+        Current weather, served from the weather cache. Waits at most weather_timeout
+        seconds for Open-Meteo; on timeout or error the fields come back as "N/A".
+        """
+        try:
+            with metrics.span("weather"):
+                return self.weather_cache.get(lat, lon, timeout=self.weather_timeout)
+        except Exception as e:
+            metrics.count("upstream_errors_total", service="open_meteo")
+            logger.warning("Weather error: %s", e)
+            return {"temperature": "N/A", "windspeed": "N/A", "weather_code": "N/A"}
+
+    async def get_weather_async(self, lat, lon, http):
+        """Async get_weather on a shared httpx.AsyncClient, through the same weather cache."""
+        async def fetch(snapped_lat, snapped_lon):
+            with metrics.span("open_meteo"):
+                response = await http.get(
+                    self.WEATHER_URL,
+                    params={"latitude": snapped_lat, "longitude": snapped_lon, "current_weather": "true"},
+                    timeout=self.weather_timeout
+                )
+                response.raise_for_status()
+                return self._parse_current_weather(response.json())
+
+        try:
+            with metrics.span("weather"):
+                return await self.weather_cache.get_async(lat, lon, fetch, timeout=self.weather_timeout)
+        except Exception as e:
+            metrics.count("upstream_errors_total", service="open_meteo")
+            logger.warning("Weather error: %s", e)
+            return {"temperature": "N/A", "windspeed": "N/A", "weather_code": "N/A"}
+
+    def _fetch_weather(self, lat, lon):
         """Fetch current weather from Open-Meteo API."""
-        url = (
-            f"https://api.open-meteo.com/v1/forecast?"
-            f"latitude={lat}&longitude={lon}&current_weather=true"
-        )
-        response = requests.get(url)
+        with metrics.span("open_meteo"):
+            response = self.session.get(
+                self.WEATHER_URL,
+                params={"latitude": lat, "longitude": lon, "current_weather": "true"},
+                timeout=self.weather_timeout
+            )
+        response.raise_for_status()
+        return self._parse_current_weather(response.json())
+
+    def get_weather_bulk(self, coords):
+        """Fetch current weather for many (lat, lon) pairs in one Open-Meteo request, in input order."""
+        if not coords:
+            return []
+        with metrics.span("open_meteo", mode="bulk"):
+            response = self.session.get(
+                self.WEATHER_URL,
+                params={
+                    "latitude": ",".join(str(lat) for lat, _ in coords),
+                    "longitude": ",".join(str(lon) for _, lon in coords),
+                    "current_weather": "true"
+                },
+                timeout=self.weather_timeout * 4
+            )
+        response.raise_for_status()
         data = response.json()
+        # Open-Meteo returns a single object for one location and a list for several
+        if isinstance(data, dict):
+            data = [data]
+        return [self._parse_current_weather(item) for item in data]
+
+    @staticmethod
+    def _parse_current_weather(data):
         cw = data.get("current_weather", {})
         return {
             "temperature": cw.get("temperature", "N/A"),
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from lazy import Lazy
+
+
+def description_key(trail, template, model):
+    """Content hash of everything an LLM trail description depends on."""
+    payload = json.dumps(
+        {"trail": dict(trail), "template": template, "model": model},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DescriptionCache:
+    """
+    Persistent SQLite cache for generated trail descriptions, keyed on description_key().
+    Up to `variants` different responses are kept per key and one is picked at random, so
+    repeat visits still see some variety; until a key has that many, lookups count as misses.
+    Hits only note their last-used time in memory; those are written in one transaction on the
+    next put(), stats() or close(), or by the first hit after `flush_interval` seconds.
+    """
+
+    def __init__(self, path=".cache/descriptions.sqlite", variants=1, max_entries=10000, max_age=30 * 24 * 3600,
+                 flush_interval=30):
+        self.path = path
+        self.variants = variants
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS descriptions ("
+            " key TEXT NOT NULL, variant INTEGER NOT NULL, text TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (key, variant))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON descriptions (last_used)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self._last_used = {}  # (key, variant) -> time of its latest hit, not yet written
+        self._flushed_at = time.monotonic()
+
+    def get(self, key):
+        """A cached description for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT variant, text FROM descriptions WHERE key = ? AND created >= ?",
+                (key, now - self.max_age)
+            ).fetchall()
+            if len(rows) < self.variants:
+                self.misses += 1
+                return None
+            variant, text = random.choice(rows)
+            self._last_used[(key, variant)] = now
+            if time.monotonic() - self._flushed_at >= self.flush_interval:
+                self._flush_last_used()
+                self._conn.commit()
+            self.hits += 1
+            return text
+
+    def _flush_last_used(self):
+        """Write the buffered hit times (caller holds the lock and commits)."""
+        if self._last_used:
+            self._conn.executemany(
+                "UPDATE descriptions SET last_used = ? WHERE key = ? AND variant = ?",
+                [(now, key, variant) for (key, variant), now in self._last_used.items()]
+            )
+            self._last_used.clear()
+        self._flushed_at = time.monotonic()
+
+    def put(self, key, text):
+        """Store a new variant for key (replacing the oldest once `variants` are stored), then evict."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT variant FROM descriptions WHERE key = ? ORDER BY created", (key,)
+            ).fetchall()
+            used = {r[0] for r in rows}
+            if len(used) < self.variants:
+                variant = min(set(range(self.variants)) - used)
+            else:
+                variant = rows[0][0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, variant, text, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, variant, text, now, now)
+            )
+            self._flush_last_used()  # So eviction sees recent hits
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Drop entries older than max_age, then least recently used ones beyond max_entries."""
+        self._conn.execute("DELETE FROM descriptions WHERE created < ?", (now - self.max_age,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM descriptions WHERE rowid IN"
+                " (SELECT rowid FROM descriptions ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        with self._lock:
+            self._flush_last_used()
+            self._conn.commit()
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()
+        lookups = self.hits + self.misses
+        return {"entries": count, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._flush_last_used()
+            self._conn.commit()
+            self._conn.close()
+
+
+class DescriptionArtifact:
+    """
+    Pre-generated descriptions stored as append-only JSON lines of {"key", "trail", "text"}.
+    Appends are flushed per record, so an interrupted batch run can resume where it stopped.
+    Only a key -> byte offset index is kept in memory; get() reads just the line it needs,
+    and rescans when the file was replaced or grown by another process (e.g. a compaction).
+    """
+
+    _KEY_PREFIX = b'{"key": "'  # How append() starts every record
+
+    def __init__(self, path="data/trail_descriptions.jsonl", lazy=False):
+        """lazy: scan the file for its key index on first lookup (or in warm_up()) instead of here."""
+        self.path = path
+        self._stat = None  # (inode, size) of the file as last scanned or written by us
+        self._offsets = Lazy(self._scan)
+        self._lock = threading.Lock()
+        if not lazy:
+            self._offsets.get()
+
+    def warm_up(self):
+        """Build the key index ahead of the first lookup."""
+        self._offsets.get()
+
+    def _scan(self):
+        """Byte offset of each key's latest complete record."""
+        offsets = {}
+        if not os.path.exists(self.path):
+            self._stat = None
+            return offsets
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partial last line from an interrupted run
+                key = self._line_key(line)
+                if key is not None:
+                    offsets[key] = offset
+                offset += len(line)
+        self._stat = (stat.st_ino, stat.st_size)
+        return offsets
+
+    def _rescan(self):
+        with self._lock:
+            self._offsets.set(self._scan())
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    @classmethod
+    def _line_key(cls, line):
+        if line.startswith(cls._KEY_PREFIX):  # Read the key without parsing the text
+            end = line.find(b'"', len(cls._KEY_PREFIX))
+            if end > 0:
+                return line[len(cls._KEY_PREFIX):end].decode("utf-8")
+        try:
+            return json.loads(line)["key"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def __contains__(self, key):
+        return key in self._offsets.get()
+
+    def __len__(self):
+        return len(self._offsets.get())
+
+    def get(self, key):
+        self._offsets.get()
+        if self._file_stat() != self._stat:
+            self._rescan()  # Replaced or appended to by another process since we indexed it
+        for attempt in range(2):
+            offset = self._offsets.get().get(key)
+            if offset is None:
+                return None
+            record = self._read(offset)
+            if record is not None and record.get("key") == key:
+                return record.get("text")
+            if attempt == 0:
+                self._rescan()  # Offsets went stale under us: index the file again and retry once
+        return None
+
+    def _read(self, offset):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                record = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        return record if isinstance(record, dict) else None
+
+    def append(self, key, trail_name, text):
+        record = json.dumps({"key": key, "trail": trail_name, "text": text}, ensure_ascii=False)
+        offsets = self._offsets.get()  # Scan first, so the index can't miss a record written mid-scan
+        with self._lock:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            known = self._file_stat() == self._stat
+            with open(self.path, "a+b") as f:
+                offset = self._drop_partial_tail(f)
+                f.write((record + "\n").encode("utf-8"))
+                f.flush()
+                stat = os.fstat(f.fileno())
+            offsets[key] = offset
+            if known:  # Otherwise leave the stat stale so the next get() rescans
+                self._stat = (stat.st_ino, stat.st_size)
+
+    @staticmethod
+    def _drop_partial_tail(f):
+        """Cut off a partial last record left by an interrupted run; returns the new end offset."""
+        end = f.seek(0, os.SEEK_END)
+        size = end
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            f.truncate(end)
+        return end
+
+    def compact(self, keep_keys):
+        """Rewrite the file keeping only keep_keys (drops descriptions of changed or removed trails)."""
+        with self._lock:
+            offsets = self._scan()
+            tmp_path = self.path + ".tmp"
+            compacted = {}
+            with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+                for key, offset in offsets.items():
+                    if key not in keep_keys:
+                        continue
+                    src.seek(offset)
+                    compacted[key] = dst.tell()
+                    dst.write(src.readline())
+            os.replace(tmp_path, self.path)
+            self._stat = self._file_stat()
+            self._offsets.set(compacted)
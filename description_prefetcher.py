@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DescriptionPrefetcher:
+    """
+    Speculatively generate descriptions for the top-N trails of a freshly shown list,
+    so the selection turn can pick up a finished (or already running) result.
+    max_wait: longest the selection turn waits for a job that is already running.
+    """
+
+    def __init__(self, describe, top_n=3, executor=None, max_wait=8.0):
+        self.describe = describe  # callable(trail) -> description text
+        self.top_n = top_n
+        self.max_wait = max_wait
+        self.executor = executor or ThreadPoolExecutor(max_workers=max(top_n, 1), thread_name_prefix="describe")
+        self._futures = {}  # trail id -> Future
+        self._lock = threading.Lock()
+
+    def prefetch(self, trails):
+        """Start describing the first top_n trails, cancelling work for any previous list."""
+        self.cancel()
+        with self._lock:
+            for trail in trails[:self.top_n]:
+                self._futures[trail.id] = self.executor.submit(self.describe, trail)
+
+    def pending(self, trail):
+        """The Future describing trail, or None if it wasn't prefetched (or was cancelled)."""
+        with self._lock:
+            future = self._futures.get(trail.id)
+        if future is None or future.cancelled():
+            return None
+        return future
+
+    def in_flight(self, trail):
+        """
+        The Future describing trail if its job is running or done, else None. A job still
+        queued (e.g. behind other sessions' prefetches on a shared pool) is cancelled instead,
+        since generating directly is faster than waiting for a worker.
+        """
+        future = self.pending(trail)
+        if future is None or future.cancel():
+            return None
+        return future
+
+    def take(self, trail, timeout=None):
+        """
+        Prefetched description for trail, waiting at most `timeout` (default max_wait) seconds
+        for a running job; None if it wasn't prefetched, hadn't started, failed or ran late.
+        """
+        future = self.in_flight(trail)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=self.max_wait if timeout is None else timeout)
+        except Exception:
+            return None
+
+    def cancel(self):
+        """Drop all speculative work; calls that haven't started yet are cancelled."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
@@ -0,0 +1,59 @@
+"""
+Deferred construction for the expensive parts of startup (Gemini client, trail catalog, POI
+extract, HTTP sessions): each is built on first use, or ahead of time by a background warm-up.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+
+
+class Lazy:
+    """A value built by factory() on first get(); concurrent first callers wait for the one build."""
+
+    __slots__ = ("_factory", "_value", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of(cls, value):
+        """An already-built value."""
+        lazy = cls(None)
+        lazy._value = value
+        return lazy
+
+    @property
+    def ready(self):
+        return self._value is not _UNSET
+
+    def get(self):
+        value = self._value
+        if value is not _UNSET:
+            return value
+        with self._lock:
+            if self._value is _UNSET:
+                self._value = self._factory()  # If this raises, the next get() tries again
+                self._factory = None
+            return self._value
+
+    def set(self, value):
+        self._value = value
+
+
+def run_in_background(*steps, name="warm-up"):
+    """Run each step (a no-argument callable) in order on a daemon thread; failures are logged and skipped."""
+    def run():
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                logger.warning("Warm-up step failed: %s", e)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
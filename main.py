@@ -2,11 +2,34 @@ from data_agent import DataAgent
 from planner_agent import PlannerAgent
 from communicator_agent import CommunicationAgent  # NEW
 from root_agent import RootAgent
+from weather_prefetcher import WeatherPrefetcher
+from trail_snapshot import SnapshotWatcher
+from description_cache import DescriptionArtifact, DescriptionCache
+import metrics
+import logging
 import os
 from dotenv import load_dotenv
 
-def main():
-    # --- Load environment variables ---
+def print_reply(chunks):
+    """Print a streamed reply chunk by chunk as it arrives."""
+    print("Agent: ", end="", flush=True)
+    for chunk in chunks:
+        print(chunk, end="", flush=True)
+    print()
+
+def start_background(root_agent):
+    """Keep weather for every trail warm and pick up edits to the trail CSV without a restart."""
+    root_agent.weather_prefetcher = WeatherPrefetcher(root_agent.planner_agent)
+    root_agent.weather_prefetcher.start()
+    SnapshotWatcher(root_agent.planner_agent).start()
+
+def create_root_agent(lazy=False):
+    """
+    Build the agents and their shared caches, returning the RootAgent.
+    lazy: defer the trail catalog, POI extract, Gemini client and background refreshers;
+    call root_agent.warm_up(lambda: start_background(root_agent)) once the greeting is out.
+    """
+    # --- Load environment variables (once; RootAgent reuses them) ---
     load_dotenv(dotenv_path="./.env")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     if not GEMINI_API_KEY:
@@ -14,26 +37,48 @@ def main():
 
     # --- Create the agents ---
     data_agent = DataAgent()
-    planner_agent = PlannerAgent(data_agent)
-    communicator_agent = CommunicationAgent()  # NEW
-    root_agent = RootAgent(planner_agent, data_agent, communicator_agent)  # pass communicator_agent
+    description_cache = DescriptionCache()  # One stored description per trail, reused as soon as it exists
+    planner_agent = PlannerAgent(data_agent, description_cache=description_cache, lazy=lazy)
+    communicator_agent = CommunicationAgent(lazy=lazy)  # NEW
+
+    description_artifact = DescriptionArtifact(lazy=lazy)  # written by pregenerate_descriptions.py
+    root_agent = RootAgent(planner_agent, data_agent, communicator_agent,
+                           description_cache=description_cache,
+                           description_artifact=description_artifact,
+                           prefetch_top_n=3, lazy=lazy)  # pass communicator_agent
+
+    # --- Keep weather for every trail warm in the background ---
+    if not lazy:
+        planner_agent.warm_up()
+        start_background(root_agent)
+    return root_agent
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    # Lazy by default: greet first, then load the catalog and Gemini client while the user types
+    lazy = os.getenv("TRAIL_BUDDY_LAZY", "1").lower() not in ("0", "false", "no", "off")
+    root_agent = create_root_agent(lazy=lazy)
 
     # --- Initial greeting ---
     print("Hey! Your trail buddy is ready to plan a new adventure! ✔️\n")
 
     # --- Get the agent's first message before user types anything ---
-    initial_message = root_agent.handle_user_message("")  # empty string triggers initial prompt
-    print("Agent:", initial_message)
+    initial_message = root_agent.handle_user_message("", stream=True)  # empty string triggers initial prompt
+    print_reply(initial_message)
+    if lazy:
+        root_agent.warm_up(lambda: start_background(root_agent))
 
     # --- Conversation loop ---
     while True:
         user_input = input("You: ")
         if user_input.lower() in ["exit", "quit"]:
             print("\nThanks for using Trail Buddy! Have a great hike! 🌲🏞️")
+            if metrics.enabled():
+                metrics.dump_json(".cache/metrics.json")  # Per-turn traces and latency histograms
             break
 
-        response = root_agent.handle_user_message(user_input)
-        print("Agent:", response)
+        response = root_agent.handle_user_message(user_input, stream=True)
+        print_reply(response)
 
 if __name__ == "__main__":
     main()
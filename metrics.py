@@ -0,0 +1,246 @@
+"""
+Built-in tracing and metrics: timed spans, counters and latency histograms, exportable as
+Prometheus text or a JSON dump.
+
+Off by default; set TRAIL_BUDDY_METRICS=1 (or call metrics.enable()) to turn it on. When off,
+span() hands back one shared no-op object and count()/observe() return after a flag check,
+so instrumented code pays next to nothing.
+
+    with metrics.span("planner.rank"):
+        ...
+    metrics.count("cache_total", result="hit")
+    print(metrics.prometheus_text())
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+
+PREFIX = "trailbuddy_"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.getenv("TRAIL_BUDDY_METRICS", "").lower() in ("1", "true", "yes", "on")
+_current_trace = contextvars.ContextVar("trailbuddy_trace", default=None)
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+
+def enabled():
+    return _enabled
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Counters, histograms and the most recent turn traces."""
+
+    def __init__(self, max_traces=100):
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def inc(self, name, value, labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(BUCKETS)] += 1
+            histogram[-1] += seconds
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.traces.clear()
+
+
+REGISTRY = Registry()
+
+
+def count(name, value=1, **labels):
+    """Add value to counter `name` (no-op when disabled)."""
+    if _enabled:
+        REGISTRY.inc(name, value, labels)
+
+
+def observe(name, seconds, **labels):
+    """Record a latency in histogram `name` (no-op when disabled)."""
+    if _enabled:
+        REGISTRY.observe(name, seconds, labels)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """Times a block into span_seconds{span=...} and, inside a turn, into that turn's trace."""
+
+    __slots__ = ("name", "labels", "attributes", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        REGISTRY.observe("span_seconds", seconds, dict(self.labels, span=self.name))
+        if exc_type is not None:
+            REGISTRY.inc("span_errors_total", 1, {"span": self.name})
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append({
+                "span": self.name, "start_ms": round((self.start - trace.start) * 1000, 3),
+                "ms": round(seconds * 1000, 3), "error": exc_type is not None,
+                **self.labels, **self.attributes,
+            })
+        return False
+
+    def set(self, **attributes):
+        """Attach extra fields (e.g. token counts) to this span's trace entry."""
+        self.attributes.update(attributes)
+
+
+def span(name, **labels):
+    """Context manager timing the enclosed block."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, labels)
+
+
+class Trace:
+    """One conversation turn: its total latency (turn_seconds{state=...}) plus the spans inside it."""
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans = []
+
+    def activate(self):
+        """Context manager making this the current trace (spans in this context are attached to it)."""
+        return _Activation(self)
+
+    def finish(self):
+        seconds = time.perf_counter() - self.start
+        REGISTRY.observe(f"{self.name}_seconds", seconds, self.labels)
+        REGISTRY.traces.append({"trace": self.name, "time": self.wall_start, "ms": round(seconds * 1000, 3),
+                                **self.labels, "spans": self.spans})
+
+
+class _Activation:
+    __slots__ = ("trace", "token")
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __enter__(self):
+        self.token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self.token)
+        return False
+
+
+def start_trace(name, **labels):
+    """A new Trace, or None when disabled."""
+    if not _enabled:
+        return None
+    return Trace(name, labels)
+
+
+# --- Export ---
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def prometheus_text(registry=REGISTRY):
+    """All counters and histograms in the Prometheus text exposition format."""
+    with registry._lock:
+        counters = dict(registry.counters)
+        histograms = {key: list(values) for key, values in registry.histograms.items()}
+
+    lines = []
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {PREFIX}{metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+    for metric in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {PREFIX}{metric} histogram")
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), values[:-1]):
+                cumulative += n
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {values[-1]}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot(registry=REGISTRY):
+    """Counters, histogram summaries and recent traces as plain JSON-serialisable data."""
+    with registry._lock:
+        counters = [{"name": name, **dict(labels), "value": value}
+                    for (name, labels), value in sorted(registry.counters.items())]
+        histograms = []
+        for (name, labels), values in sorted(registry.histograms.items()):
+            histograms.append({"name": name, **dict(labels), "count": sum(values[:-1]),
+                               "sum": values[-1], "buckets": dict(zip(map(str, BUCKETS + ("+Inf",)), values[:-1]))})
+        traces = list(registry.traces)
+    return {"counters": counters, "histograms": histograms, "traces": traces}
+
+
+def dump_json(path, registry=REGISTRY):
+    """Write snapshot() to path."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(registry), f, indent=2)
@@ -0,0 +1,248 @@
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+
+_APOSTROPHES = re.compile(r"['\u2019]")
+_SEPARATORS = re.compile(r"[\W_]+")
+# _SEPARATORS for ASCII bytes: everything but letters, digits and newlines becomes a space
+_ASCII_SEPARATORS = bytes(c if chr(c).isalnum() or c == 10 else 32 for c in range(256))
+
+
+def normalize_name(text):
+    """Lowercase, apostrophes dropped ("john's" -> "johns"), other punctuation and whitespace collapsed."""
+    return _SEPARATORS.sub(" ", _APOSTROPHES.sub("", text.lower())).strip()
+
+
+def _normalized_text(names):
+    """
+    normalize_name() of every name, UTF-8 encoded and joined by newlines. All-ASCII input (the
+    usual case) is normalized in a few passes over the joined bytes rather than once per name.
+    """
+    joined = "\n".join(names)
+    if joined.isascii():
+        lines = joined.encode("ascii").lower().translate(_ASCII_SEPARATORS, b"'").split(b"\n")
+        if len(lines) == len(names):  # Otherwise a name contained a newline itself
+            return b"\n".join([b" ".join(line.split()) for line in lines])  # Collapse and strip spaces
+    return "\n".join(normalize_name(name) for name in names).encode("utf-8")
+
+
+class NameIndex:
+    """
+    Trail-name lookup that tolerates partial names and typos.
+
+    Every word-start suffix of each normalized name ("helvellyn via striding edge",
+    "via striding edge", "striding edge", "edge") is kept in sorted order, so exact and
+    prefix matches ("fairfield", "striding edge") are a binary search. Failing that, names
+    are ranked by trigram similarity (Dice coefficient) using a trigram -> ids posting index.
+
+    Everything is held in flat arrays over one UTF-8 buffer of the normalized names (suffixes
+    are byte offsets into it, compared as bytes) and built with numpy, without a Python object
+    per suffix.
+    """
+
+    def __init__(self, names, threshold=0.35, min_prefix=3):
+        """
+        names: trail names in id order (any iterable).
+        min_prefix: shorter queries only match a whole name or word exactly, so "g" is not taken
+        as the start of every name beginning with g.
+        """
+        self.threshold = threshold  # Minimum trigram similarity for a fuzzy match
+        self.min_prefix = min_prefix
+        names = list(names)
+
+        # Normalized names joined by newlines; word starts and name bounds found with numpy
+        raw = _normalized_text(names)
+        text = np.frombuffer(raw, dtype=np.uint8)
+        breaks = np.flatnonzero(text == 10)
+        name_starts = np.concatenate(([0], breaks + 1)) if names else breaks
+        name_ends = np.append(breaks, len(text)) if names else breaks
+        lengths = name_ends - name_starts
+        previous = np.concatenate(([10], text[:-1]))
+        word_starts = np.flatnonzero((text != 32) & (text != 10) & ((previous == 32) | (previous == 10)))
+        del previous
+        owners = (np.searchsorted(name_starts, word_starts, side="right") - 1).astype(np.int32)
+
+        # Word-start suffixes sorted bytewise (the same order as sorting the strings)
+        order = _sort_byte_strings(text, word_starts, name_ends[owners])
+
+        self._attach(text, name_starts, name_ends, word_starts[order], owners[order],
+                     *self._build_trigrams(raw, lengths))
+
+    def _attach(self, text, name_starts, name_ends, key_starts, key_ids,
+                trigrams, trigram_offsets, trigram_ids, trigram_counts):
+        self._text = text
+        self._name_starts = name_starts
+        self._name_ends = name_ends
+        self._key_starts = key_starts
+        self._key_ids = key_ids
+        self._trigrams = trigrams
+        self._trigram_offsets = trigram_offsets
+        self._trigram_ids = trigram_ids
+        self._trigram_counts = trigram_counts
+        self._keys = _SortedKeys(text, key_starts, key_ids, name_ends)
+
+    @staticmethod
+    def _build_trigrams(raw, lengths):
+        """
+        Trigram posting lists from the newline-joined names, each padded with a space on both
+        sides as in _query_trigrams(), without a per-name or per-trigram Python loop.
+        """
+        if not len(lengths):
+            empty = np.zeros(0, dtype=np.int64)
+            return np.zeros(0, dtype=np.uint64), np.zeros(1, dtype=np.int64), empty.astype(np.int32), empty
+        data = np.frombuffer(b" " + raw.replace(b"\n", b"  ") + b" ", dtype=np.uint8)
+
+        # A trigram starts at every byte except the last two of each padded name
+        padded = lengths + 2
+        ends = np.cumsum(padded)
+        valid = np.ones(len(data) - 2, dtype=bool)
+        valid[ends[:-1] - 1] = False
+        valid[ends[:-1] - 2] = False
+
+        # (trigram << 32 | trail id) for each valid start, built in place in one uint64 array
+        pairs = data[:-2].astype(np.uint64)
+        for shift, column in ((8, data[1:-1]), (8, data[2:])):
+            pairs <<= np.uint64(shift)
+            pairs |= column
+        pairs <<= np.uint64(32)
+        pairs |= np.repeat(np.arange(len(lengths), dtype=np.uint32), padded)[:-2]
+        pairs = pairs[valid]
+        del valid
+
+        # Unique pairs sorted by trigram then trail: each trigram's postings are contiguous
+        pairs.sort()
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        trigram_ids = (pairs & np.uint64(0xFFFFFFFF)).astype(np.int32)
+        pairs >>= np.uint64(32)
+        first = np.flatnonzero(np.concatenate(([True], pairs[1:] != pairs[:-1])))
+        return (pairs[first], np.append(first, len(pairs)).astype(np.int64), trigram_ids,
+                np.bincount(trigram_ids, minlength=len(lengths)))
+
+    @staticmethod
+    def _query_trigrams(normalized):
+        data = f" {normalized} ".encode("utf-8")
+        return {(data[i] << 16) | (data[i + 1] << 8) | data[i + 2] for i in range(len(data) - 2)}
+
+    def search(self, query, limit=5, ids=None):
+        """
+        Best matching trails for query as (trail_id, score) pairs, best first.
+        Exact name = 1.0; name prefix 0.8-1.0 and word prefix 0.6-0.8 (longer coverage scores
+        higher); otherwise trigram similarity, with only matches at or above threshold returned.
+        Queries shorter than min_prefix only match whole names or words.
+        ids: optional trail ids to search within (e.g. the options currently listed).
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+        allowed = None if ids is None else np.asarray(ids, dtype=np.intp)
+
+        # Exact and prefix matches: one contiguous range of the sorted suffixes.
+        # Short queries only take suffixes equal to the query or continuing with a space ("!" sorts right after " ")
+        key = query.encode("utf-8")
+        start = bisect_left(self._keys, key)
+        stop = bisect_left(self._keys, key + (b"\xff" if len(query) >= self.min_prefix else b"!"), lo=start)
+        if stop > start:
+            hit_ids = self._key_ids[start:stop]
+            coverage = len(key) / (self._name_ends[hit_ids] - self._name_starts[hit_ids])
+            is_start = self._key_starts[start:stop] == self._name_starts[hit_ids]
+            score = np.where(is_start, 0.8, 0.6) + 0.2 * coverage
+            matches = self._best(hit_ids, score, allowed, limit)
+            if matches:
+                return matches
+
+        # Fuzzy: count shared trigrams per trail from the posting lists of the query's trigrams
+        query_trigrams = np.array(sorted(self._query_trigrams(query)), dtype=np.uint64)
+        slots = np.searchsorted(self._trigrams, query_trigrams)
+        found = slots < len(self._trigrams)
+        found[found] = self._trigrams[slots[found]] == query_trigrams[found]
+        slots = slots[found]
+        if len(slots) == 0:
+            return []
+        postings = np.concatenate([
+            self._trigram_ids[self._trigram_offsets[s]:self._trigram_offsets[s + 1]] for s in slots
+        ])
+        hit_ids, shared = np.unique(postings, return_counts=True)
+        score = 2 * shared / (len(query_trigrams) + self._trigram_counts[hit_ids])
+        keep = score >= self.threshold
+        return self._best(hit_ids[keep], score[keep], allowed, limit)
+
+    @staticmethod
+    def _best(hit_ids, score, allowed, limit):
+        """Top `limit` (id, score) pairs, best score per id, restricted to allowed ids."""
+        if allowed is not None:
+            keep = np.isin(hit_ids, allowed)
+            hit_ids, score = hit_ids[keep], score[keep]
+        # Highest score first; keep each id's first (best) appearance
+        order = np.lexsort((hit_ids, -score))
+        hit_ids, score = hit_ids[order], score[order]
+        _, first = np.unique(hit_ids, return_index=True)
+        first = np.sort(first)[:limit]
+        return list(zip(hit_ids[first].tolist(), score[first].tolist()))
+
+    def best(self, query, ids=None):
+        """The single best matching trail id, or None."""
+        matches = self.search(query, limit=1, ids=ids)
+        return matches[0][0] if matches else None
+
+
+def _sort_byte_strings(text, starts, ends):
+    """
+    Order sorting the byte strings text[starts[i]:ends[i]] (which contain no zero bytes).
+    Each pass sorts the groups still tied on one uint64 key: the group's rank in the high bits
+    and the strings' next few bytes below it, so no per-string Python objects are created.
+    """
+    # Element i of `words` is the 8 bytes starting at text[i], read as a big-endian integer
+    padded = np.append(text, np.zeros(8, np.uint8))
+    words = np.ndarray(shape=(len(text),), dtype=">u8", buffer=padded, strides=(1,))
+    order = np.arange(len(starts))
+    active = order.copy()  # Sorted positions whose group is still tied; each group is contiguous
+    rank = np.zeros(len(starts), dtype=np.uint64)  # Per active position: its group's rank among active groups
+    depth = 0
+    while len(active):
+        ids = order[active]
+        width = min(8, (64 - int(rank[-1]).bit_length()) // 8)  # Bytes that fit below the rank bits
+        key = _chunk(words, starts[ids] + depth, ends[ids], width)
+        key |= rank << np.uint64(8 * width)
+        resort = np.argsort(key)
+        ids, key = ids[resort], key[resort]
+        order[active] = ids
+        depth += width
+
+        # New groups: runs of equal keys. One is settled when it has one string, or none of its
+        # strings go on past this chunk (then they are all equal)
+        heads = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+        sizes = np.diff(np.append(heads, len(active)))
+        longest = np.maximum.reduceat(ends[ids] - starts[ids], heads)
+        tied = (sizes > 1) & (longest > depth)
+        active = active[np.repeat(tied, sizes)]
+        rank = np.repeat(np.arange(np.count_nonzero(tied), dtype=np.uint64), sizes[tied])
+    return order
+
+
+def _chunk(words, positions, ends, width):
+    """The `width` bytes at each position as a big-endian integer, with bytes past ends zeroed."""
+    key = words[np.minimum(positions, len(words) - 1)].astype(np.uint64)
+    drop = (8 - np.clip(ends - positions, 0, width)).astype(np.uint64) * np.uint64(8)
+    half = drop // np.uint64(2)  # Shift in two steps: a single 64-bit shift is undefined
+    key = ((key >> half) >> (drop - half)) << (drop - np.uint64(64 - 8 * width))
+    return key
+
+
+class _SortedKeys:
+    """The sorted word-start suffixes as a read-only sequence of bytes, sliced out on demand for bisect."""
+
+    __slots__ = ("text", "starts", "ids", "name_ends")
+
+    def __init__(self, text, starts, ids, name_ends):
+        self.text = text
+        self.starts = starts
+        self.ids = ids
+        self.name_ends = name_ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        return self.text[self.starts[i]:self.name_ends[self.ids[i]]].tobytes()
@@ -1,93 +1,175 @@
-import random
+import os
+import numpy as np
+import metrics
+from description_cache import description_key
+from lazy import Lazy
+from query_parser import QueryParser
+from trail_snapshot import source_changed
+
 
 class PlannerAgent:
     """Select trails based on difficulty and max distance, with scoring and ranking."""
 
-    def __init__(self, data_agent):
-        self.data_agent = data_agent
-        self.trails = self.data_agent.load_trails()
-
-    def _score_trail(self, trail, desired_difficulty, max_distance):
-        """Compute a score for a trail based on difficulty and distance."""
-        score = 0
-
-        # Difficulty scoring: exact match = 1, near match = 0.5, else 0
-        difficulty_order = ["very easy", "easy", "moderate", "hard", "very hard"]
-        trail_diff_index = difficulty_order.index(trail["Difficulty"].lower())
-        desired_index = difficulty_order.index(desired_difficulty.lower())
-
-        if trail_diff_index == desired_index:
-            score += 1.0
-        elif abs(trail_diff_index - desired_index) == 1:
-            score += 0.5
-
-        # Distance scoring: closer to max_distance is better
-        if trail["Distance_km"] <= max_distance:
-            score += trail["Distance_km"] / max_distance  # normalized 0-1
-        else:
-            score -= 0.5  # Penalize trails exceeding max_distance slightly
-
-        return score
+    MAX_RESULTS = 50  # Default number of ranked trails a search returns
 
-    def get_trails_by_criteria(self, difficulty, max_distance):
-        scored_trails = []
-
-        for trail in self.trails:
-            score = self._score_trail(trail, difficulty, max_distance)
-            if score > 0:  # keep only positive-scoring trails
-                scored_trails.append((trail, score))
+    TRAIL_DETAILS_PROMPT = """
+You are an expert Lake District trail guide.
 
-        if not scored_trails:
-            # Handle edge case: no suitable trail
-            return {"message": "No trails match your criteria. Here are some closest options:",
-                    "trails": sorted(self.trails, key=lambda t: abs(t["Distance_km"] - max_distance))[:5]}
+Generate a friendly, vivid trail description for hikers based on the structured data below.
+Do NOT invent facts — stay close to the info provided.
 
-        # Sort by score descending
-        scored_trails.sort(key=lambda x: x[1], reverse=True)
+TRAIL NAME: {name}
+DISTANCE (km): {distance}
+DIFFICULTY: {difficulty}
+FELL HEIGHT (m): {fell_height}
+ROUTE SUMMARY: {route}
+VIEWS / HIGHLIGHTS: {views}
 
-        # Handle tie-breaking randomly
-        final_trails = []
-        i = 0
-        while i < len(scored_trails):
-            tie_group = [scored_trails[i]]
-            j = i + 1
-            while j < len(scored_trails) and scored_trails[j][1] == scored_trails[i][1]:
-                tie_group.append(scored_trails[j])
-                j += 1
-            random.shuffle(tie_group)  # randomize tie group
-            final_trails.extend([t[0] for t in tie_group])
-            i = j
+Write a natural-sounding paragraph (4–6 sentences).
+"""
 
-        return final_trails
+    def __init__(self, data_agent, description_cache=None, lazy=False):
+        """lazy: open the trail catalog on first use (or in warm_up()) instead of here."""
+        self.data_agent = data_agent
+        self.description_cache = description_cache  # Optional DescriptionCache
+        self._source_stat = None
+        self._store = Lazy(self._load_store)
+        if not lazy:
+            self._store.get()
+        self._query_parser = None  # (store, QueryParser) for the current catalog
+
+    def _load_store(self):
+        self._source_stat = self._stat_source()
+        return self.data_agent.load_trail_store()
+
+    @property
+    def store(self):
+        """The current TrailStore."""
+        return self._store.get()
+
+    def warm_up(self):
+        """Open the catalog (with its name index) and build the query parser ahead of the first search."""
+        self._parser()
+        self.store.name_index
+
+    @property
+    def trails(self):
+        """The current catalog: indexable by trail id, iterates TrailRecords."""
+        return self.store
+
+    def _stat_source(self):
+        stat = os.stat(self.data_agent.csv_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self):
+        """
+        Swap to a freshly compiled catalog if the source CSV changed; returns True if it did.
+        The swap is a single reference assignment, so in-flight queries finish on the old store.
+        """
+        if not self._store.ready:
+            return False  # Not opened yet: the first use will load the current CSV anyway
+        source_stat = self._stat_source()
+        if source_stat == self._source_stat:
+            return False
+        self._source_stat = source_stat
+        if self.store.source is not None and not source_changed(self.store.source, self.data_agent.csv_path,
+                                                              self.data_agent.snapshot_path):
+            return False
+        store = self.data_agent.load_trail_store()
+        if "name_index" in vars(self.store):
+            store.name_index  # Rebuild here, in the reload thread, rather than on the next name search
+        self._store.set(store)
+        return True
+
+    def parse_query(self, text):
+        """Search criteria in a free-text message (see QueryParser.parse), using the current catalog's vocabulary."""
+        if not text.strip():
+            return {}  # Nothing to parse; don't open the catalog for the greeting turn
+        with metrics.span("planner.parse"):
+            return self._parser().parse(text)
+
+    def _parser(self):
+        store = self.store
+        cached = self._query_parser
+        if cached is None or cached[0] is not store:
+            cached = self._query_parser = (store, QueryParser.from_store(store))
+        return cached[1]
+
+    def get_trails_by_criteria(self, difficulty, max_distance, origin=None, radius_km=10, limit=MAX_RESULTS,
+                               filters=None):
+        """
+        Rank trails by difficulty and distance score in one vectorized pass.
+        origin: optional (lat, lng); only trails within radius_km of it are considered.
+        limit: return only the top `limit` trails (avoids sorting the whole catalog); None ranks every match.
+        filters: optional TrailStore.filter() criteria, e.g. {"classification": "Wainwright",
+            "region": "Eastern Fells", "max_duration": 4, "suitable_for": "families"}; only
+            matching trails are scored.
+        """
+        store = self.store  # One catalog for the whole query, even if a reload swaps it meanwhile
+        with metrics.span("planner.rank"):
+            candidates = store.filter(**filters) if filters else None
+            if origin is not None:
+                nearby, _ = store.spatial.within_radius(origin[0], origin[1], radius_km)
+                candidates = nearby if candidates is None else np.intersect1d(candidates, nearby)
+
+            ranked = store.rank(difficulty, max_distance, ids=candidates, limit=limit)
+
+            if len(ranked) == 0:
+                # Handle edge case: no suitable trail
+                if origin is not None:
+                    closest, _ = store.spatial.nearest(origin[0], origin[1], k=5)
+                elif candidates is not None and len(candidates):
+                    closest = store.closest_by_distance(max_distance, k=5, ids=candidates)
+                else:
+                    closest = store.closest_by_distance(max_distance, k=5)
+                return {"message": "No trails match your criteria. Here are some closest options:",
+                        "trails": [store[i] for i in closest]}
+
+            return [store[i] for i in ranked]
+
+    def get_trails_near(self, lat, lng, k=5, radius_km=None):
+        """
+        Trails nearest to a location, closest first, as (trail, distance_km) pairs.
+        radius_km: if given, return every trail within that radius instead of the k nearest.
+        """
+        store = self.store
+        if radius_km is not None:
+            ids, dist = store.spatial.within_radius(lat, lng, radius_km)
+        else:
+            ids, dist = store.spatial.nearest(lat, lng, k=k)
+        return [(store[i], round(float(d), 2)) for i, d in zip(ids, dist)]
 
     # --- New method to generate natural-language trail description ---
     def get_trail_details(self, trail_name, gemini_client):
         """
         Look up the trail row from CSV and ask Gemini to generate a friendly natural-language description.
+        trail_name may be partial or misspelt ("striding edge", "skidaw"); the closest name is used.
         """
-        trail_data = None
-        for t in self.trails:
-            if t["Trail"].lower() == trail_name.lower():
-                trail_data = t
-                break
+        store = self.store
+        trail_id = store.name_index.best(trail_name)
+        trail_data = store[trail_id] if trail_id is not None else None
 
         if not trail_data:
             return "I couldn't find details for that trail."
 
-        prompt = f"""
-You are an expert Lake District trail guide.
-
-Generate a friendly, vivid trail description for hikers based on the structured data below.
-Do NOT invent facts — stay close to the info provided.
-
-TRAIL NAME: {trail_data['Trail']}
-DISTANCE (km): {trail_data['Distance_km']}
-DIFFICULTY: {trail_data['Difficulty']}
-FELL HEIGHT (m): {trail_data.get('Fell_Height_ft', '?')}
-ROUTE SUMMARY: {trail_data.get('Route', 'N/A')}
-VIEWS / HIGHLIGHTS: {trail_data.get('Views', 'N/A')}
-
-Write a natural-sounding paragraph (4–6 sentences).
-"""
+        # Cached by trail row + prompt template + model, so repeat lookups skip the LLM call
+        cache_key = None
+        if self.description_cache is not None:
+            model = getattr(gemini_client, "model_name", type(gemini_client).__name__)
+            cache_key = description_key(trail_data, self.TRAIL_DETAILS_PROMPT, model)
+            cached = self.description_cache.get(cache_key)
+            if cached:
+                return cached
+
+        prompt = self.TRAIL_DETAILS_PROMPT.format(
+            name=trail_data['Trail'],
+            distance=trail_data['Distance_km'],
+            difficulty=trail_data['Difficulty'],
+            fell_height=trail_data.get('Fell_Height_ft', '?'),
+            route=trail_data.get('Route', 'N/A'),
+            views=trail_data.get('Views', 'N/A')
+        )
         response = gemini_client.generate_content(prompt)
+        if response.text and cache_key is not None:
+            self.description_cache.put(cache_key, response.text)
         return response.text if response.text else f"{trail_name} is a great trail!"
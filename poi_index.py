@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+import sys
+import numpy as np
+from spatial_index import SpatialIndex
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+LAKE_DISTRICT_BBOX = (54.2, -3.6, 54.8, -2.6)  # south, west, north, east
+
+
+def parse_overpass_elements(elements):
+    """Turn Overpass nodes/ways/relations into POI dicts (ways and relations use their center)."""
+    for elem in elements:
+        tags = elem.get("tags", {})
+        point = elem if "lat" in elem else elem.get("center")
+        if not point or "amenity" not in tags:
+            continue
+        yield {"name": tags.get("name", "Unnamed"), "amenity": tags["amenity"],
+               "lat": point["lat"], "lng": point["lon"]}
+
+
+class PoiIndex:
+    """Offline points of interest (pubs, cafes, ...) with one spatial index per amenity type."""
+
+    def __init__(self, pois):
+        """pois: iterable of dicts with name, amenity, lat and lng."""
+        self.names = []
+        amenities, lats, lngs = [], [], []
+        for poi in pois:
+            self.names.append(poi.get("name") or "Unnamed")
+            amenities.append(poi["amenity"])
+            lats.append(float(poi["lat"]))
+            lngs.append(float(poi["lng"]))
+
+        self.amenities = amenities
+        self.lat = np.array(lats, dtype=np.float64)
+        self.lng = np.array(lngs, dtype=np.float64)
+
+        # Per-amenity global ids plus a spatial index over just those points
+        self.by_amenity = {}
+        amenity_arr = np.array(amenities, dtype=object)
+        for amenity in set(amenities):
+            ids = np.flatnonzero(amenity_arr == amenity)
+            self.by_amenity[amenity] = (ids, SpatialIndex(self.lat[ids], self.lng[ids]))
+
+    def __len__(self):
+        return len(self.names)
+
+    # --- Loading ---
+    @classmethod
+    def from_file(cls, path):
+        """Load a CSV (name, amenity, lat, lng/lon) or JSON dump (Overpass output or a list of POIs)."""
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                data = json.load(f)
+                if isinstance(data, dict):
+                    return cls(parse_overpass_elements(data.get("elements", [])))
+                return cls({**p, "lng": p.get("lng", p.get("lon"))} for p in data)
+            return cls({**row, "lng": row.get("lng") or row.get("lon")} for row in csv.DictReader(f))
+
+    @classmethod
+    def from_overpass(cls, south, west, north, east, amenities=("pub", "cafe"), timeout=180):
+        """Refresh source: download every matching amenity in a bounding box from Overpass."""
+        import requests  # Only this refresh path talks to Overpass
+
+        amenity_filter = "|".join(amenities)
+        query = f"""
+        [out:json][timeout:{timeout}];
+        nwr["amenity"~"^({amenity_filter})$"]({south},{west},{north},{east});
+        out center;
+        """
+        response = requests.post(OVERPASS_URL, data={"data": query}, timeout=timeout)
+        response.raise_for_status()
+        return cls(parse_overpass_elements(response.json().get("elements", [])))
+
+    def save(self, path):
+        """Write the index back out as a CSV extract (atomically, so readers never see a partial file)."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "amenity", "lat", "lng"])
+            for i, name in enumerate(self.names):
+                writer.writerow([name, self.amenities[i], self.lat[i], self.lng[i]])
+        os.replace(tmp_path, path)
+
+    # --- Queries ---
+    def nearby(self, lat, lng, amenity, radius_km=5, k=None):
+        """
+        POIs of one amenity type within a true great-circle radius, nearest first.
+        Returns a list of dicts with name and distance_km, at most k long if k is given.
+        """
+        if amenity not in self.by_amenity:
+            return []
+        ids, index = self.by_amenity[amenity]
+        local, dist = index.within_radius(lat, lng, radius_km)
+        if k is not None:
+            local, dist = local[:k], dist[:k]
+        return [{"name": self.names[ids[i]], "distance_km": round(float(d), 2)} for i, d in zip(local, dist)]
+
+
+if __name__ == "__main__":
+    # Build an offline extract, e.g. for the Lake District (CommunicationAgent downloads this one on first run):
+    #   python poi_index.py 54.2 -3.6 54.8 -2.6 data/osm_pois.csv
+    if len(sys.argv) != 6:
+        sys.exit("Usage: python poi_index.py SOUTH WEST NORTH EAST OUTPUT.csv")
+    south, west, north, east = (float(v) for v in sys.argv[1:5])
+    index = PoiIndex.from_overpass(south, west, north, east)
+    index.save(sys.argv[5])
+    print(f"Saved {len(index)} POIs to {sys.argv[5]}")
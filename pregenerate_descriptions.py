@@ -0,0 +1,172 @@
+"""
+Offline batch job: pre-generate Gemini descriptions for every trail in the catalog.
+
+Results are appended to a JSON-lines artifact that RootAgent.generate_trail_description
+reads before calling Gemini. Runs are resumable and incremental: each description is keyed
+on a hash of the trail row, prompt template and model, so only new or changed trails are
+sent to Gemini.
+
+    python pregenerate_descriptions.py --workers 8 --rate 4
+    python pregenerate_descriptions.py --stub   # offline dry run, no API calls
+"""
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from data_agent import DataAgent
+from description_cache import DescriptionArtifact, description_key
+from root_agent import RootAgent
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket shared by all workers: at most `rate` calls per second, bursts up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class StubClient:
+    """Stand-in for genai.Client that returns canned text, for offline runs."""
+
+    class _Response:
+        def __init__(self, text):
+            self.text = text
+
+    class _Models:
+        def generate_content(self, model, contents, config=None):
+            name = contents.split("Name: ", 1)[-1].split("\n", 1)[0]
+            return StubClient._Response(f"{name} is a lovely walk. (stub description from {model})")
+
+    def __init__(self):
+        self.models = self._Models()
+
+
+def make_generate(client, model, max_output_tokens=500):
+    """Wrap a genai-style client as generate(prompt) -> text, raising on an empty response."""
+    config = None
+    if not isinstance(client, StubClient):
+        from google.genai import types
+        config = types.GenerateContentConfig(max_output_tokens=max_output_tokens)
+
+    def generate(prompt):
+        response = client.models.generate_content(model=model, contents=prompt, config=config)
+        text = (getattr(response, "text", None) or "").strip()
+        if not text:
+            raise RuntimeError("empty response")
+        return text
+
+    return generate
+
+
+def pregenerate(trails, generate, artifact, model, workers=4, rate=2.0, max_retries=4, backoff=1.0):
+    """
+    Generate descriptions for every trail not already in the artifact.
+    trails: iterable of trail dicts (streamed; at most 2 * workers are in flight at once)
+    generate: callable(prompt) -> text
+    Returns a dict of counts: generated, skipped, failed.
+    """
+    limiter = RateLimiter(rate)
+    counts = {"generated": 0, "skipped": 0, "failed": 0}
+    seen_keys = set()
+
+    def job(key, trail):
+        prompt = RootAgent.build_description_prompt(trail)
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                text = generate(prompt)
+                artifact.append(key, trail["Trail"], text)
+                return True
+            except Exception as e:
+                if attempt == max_retries:
+                    logger.warning("Giving up on %s: %s", trail["Trail"], e)
+                    return False
+                # Exponential backoff with jitter
+                time.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for trail in trails:
+            key = description_key(trail, RootAgent.TRAIL_DESCRIPTION_PROMPT, model)
+            seen_keys.add(key)
+            if artifact.get(key) is not None:
+                counts["skipped"] += 1
+                continue
+
+            # Bounded queue: don't pull more trails than the pool can work on
+            while len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    counts["generated" if future.result() else "failed"] += 1
+            in_flight.add(pool.submit(job, key, trail))
+
+        for future in in_flight:
+            counts["generated" if future.result() else "failed"] += 1
+
+    # Drop descriptions of trails that changed or disappeared from the catalog
+    if os.path.exists(artifact.path):
+        artifact.compact(seen_keys)
+    return counts
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Pre-generate trail descriptions with Gemini.")
+    parser.add_argument("--csv", default="data/lake_district_trails.csv")
+    parser.add_argument("--out", default="data/trail_descriptions.jsonl")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="max Gemini calls per second")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--stub", action="store_true", help="use a canned offline client instead of Gemini")
+    args = parser.parse_args()
+
+    if args.stub:
+        client = StubClient()
+    else:
+        from dotenv import load_dotenv
+        from google import genai
+        load_dotenv(dotenv_path="./.env")
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("Please set GEMINI_API_KEY in your .env file.")
+        client = genai.Client(api_key=api_key)
+
+    artifact = DescriptionArtifact(args.out)
+    counts = pregenerate(
+        DataAgent(args.csv).iter_trails(),
+        make_generate(client, args.model),
+        artifact,
+        args.model,
+        workers=args.workers,
+        rate=args.rate,
+        max_retries=args.retries
+    )
+    print(f"Generated {counts['generated']}, unchanged {counts['skipped']}, failed {counts['failed']} "
+          f"-> {args.out} ({len(artifact)} descriptions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import re
+
+import numpy as np
+
+from name_index import normalize_name
+from trail_store import DIFFICULTY_ORDER
+
+# Number + unit patterns, matched on the lowercased raw message (normalizing would split "8.5")
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_DISTANCE = re.compile(_NUMBER + r"\s*(km|kms|kilomet(?:re|er)s?|k|mi|miles?)\b")
+_DURATION = re.compile(_NUMBER + r"\s*(h|hrs?|hours?)\b")
+_BOUNDED = re.compile(r"\b(?:under|below|up to|max(?:imum)?|less than|within|at most)\s+"
+                      + _NUMBER + r"\b(?!\.\d)(?!\s*(?:h|hrs?|hours?)\b)")  # "under 8": km implied
+_BARE_NUMBER = re.compile(r"^\s*" + _NUMBER + r"\s*$")
+
+KM_PER_MILE = 1.609344
+
+DIFFICULTY_SYNONYMS = {
+    "medium": "moderate",
+    "gentle": "easy",
+    "leisurely": "very easy",
+    "challenging": "hard",
+    "difficult": "hard",
+    "tough": "hard",
+    "strenuous": "very hard",
+}
+
+AMENITY_PHRASES = {
+    "pub": "pub", "pubs": "pub", "inn": "pub", "beer": "pub", "pint": "pub",
+    "cafe": "cafe", "cafes": "cafe", "café": "cafe", "cafés": "cafe", "coffee": "cafe",
+    "tea room": "cafe", "tea rooms": "cafe", "tearoom": "cafe", "tearooms": "cafe",
+}
+
+# Splits a Starting_Point like "Keswick or Hawse End" / "Patterdale (Glenridding)" into place names
+_PLACE_SEPARATORS = re.compile(r"\s*(?:[(),/;]|\bor\b|\bnear\b|\bvia\b|\band\b)\s*", re.IGNORECASE)
+
+
+class QueryParser:
+    """
+    LLM-free extraction of trail search criteria from one free-text message, e.g.
+    "moderate walk under 8km near Keswick with a pub".
+
+    Numbers with units come from precompiled regexes. Words and phrases (difficulty levels,
+    regions, fell classifications, suitability tags, start-point places and amenities) are
+    looked up in one phrase table by scanning the message's word n-grams longest first, so
+    "very hard" wins over "hard" and the cost doesn't grow with the vocabulary.
+    """
+
+    PLACE_RADIUS_KM = 10  # Search radius around a named place
+
+    def __init__(self, regions=(), classifications=(), suitable_for=(), places=None):
+        """places: {place name: (lat, lng)} gazetteer; the other vocabularies are lists of values."""
+        self.phrases = {}  # normalized phrase -> (kind, value); the first kind to claim a phrase keeps it
+        for level in DIFFICULTY_ORDER:
+            self._add(level, "difficulty", level)
+        for word, level in DIFFICULTY_SYNONYMS.items():
+            self._add(word, "difficulty", level)
+        for phrase, amenity in AMENITY_PHRASES.items():
+            self._add(phrase, "amenity", amenity)
+        for region in regions:
+            self._add(region, "region", region)
+        for classification in classifications:
+            self._add(classification, "classification", classification)
+            self._add(classification + "s", "classification", classification)
+        for tag in suitable_for:
+            if len(tag.split()) <= 3:
+                self._add(tag, "suitable_for", tag)
+        for place, coordinates in (places or {}).items():
+            self._add(place, "place", (place, coordinates))
+        self.max_words = max(len(phrase.split()) for phrase in self.phrases)
+
+    def _add(self, phrase, kind, value):
+        phrase = normalize_name(phrase)
+        if phrase and phrase not in self.phrases:
+            self.phrases[phrase] = (kind, value)
+
+    @classmethod
+    def from_store(cls, store):
+        """Build the vocabularies from a TrailStore's columns (start points become the place gazetteer)."""
+        indexes = store.attribute_indexes
+
+        # Centroid of each distinct start point, then of each place name mentioned in them
+        codes = np.asarray(store.starting_points.codes)
+        counts = np.bincount(codes, minlength=len(store.starting_points.values))
+        lat_sums = np.bincount(codes, weights=store.lat, minlength=len(counts))
+        lng_sums = np.bincount(codes, weights=store.lng, minlength=len(counts))
+        totals = {}
+        for code, value in enumerate(store.starting_points.values):
+            for place in _PLACE_SEPARATORS.split(value):
+                place = place.strip()
+                if len(place) < 3 or not re.search(r"[^\W\d]", place):
+                    continue
+                n, lat, lng = totals.get(place, (0, 0.0, 0.0))
+                totals[place] = (n + counts[code], lat + lat_sums[code], lng + lng_sums[code])
+        places = {place: (float(lat / n), float(lng / n)) for place, (n, lat, lng) in totals.items() if n}
+
+        return cls(regions=indexes["region"].values,
+                   classifications=indexes["classification"].values,
+                   suitable_for=indexes["suitable_for"].values,
+                   places=places)
+
+    def parse(self, text):
+        """
+        Criteria found in text, as a dict with any of: difficulty, max_distance (km),
+        max_duration (hours), region, classification, suitable_for, place, origin (lat, lng),
+        radius_km and amenity. Missing criteria are simply absent.
+        """
+        lowered = text.lower()
+        criteria = {}
+
+        match = _DISTANCE.search(lowered)
+        if match:
+            value = float(match.group(1))
+            criteria["max_distance"] = value * KM_PER_MILE if match.group(2).startswith("mi") else value
+        else:
+            match = _BOUNDED.search(lowered) or _BARE_NUMBER.match(lowered)
+            if match:
+                criteria["max_distance"] = float(match.group(1))
+
+        match = _DURATION.search(lowered)
+        if match:
+            criteria["max_duration"] = float(match.group(1))
+
+        # Leftmost-longest phrase matches over the normalized words
+        words = normalize_name(text).split()
+        i = 0
+        while i < len(words):
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                found = self.phrases.get(" ".join(words[i:i + n]))
+                if found is not None:
+                    break
+            else:
+                i += 1
+                continue
+            kind, value = found
+            if kind == "place":
+                criteria.setdefault("place", value[0])
+                criteria.setdefault("origin", value[1])
+                criteria.setdefault("radius_km", self.PLACE_RADIUS_KM)
+            else:
+                criteria.setdefault(kind, value)
+            i += n
+
+        return criteria
@@ -0,0 +1,340 @@
+"""
+Latency budgets for upstream calls: per-call deadlines, hedged retries and a circuit breaker.
+
+CallGuard.call(fn, *args) runs fn on a worker thread and waits at most `timeout` seconds.
+Abandoned attempts keep their worker until fn returns, so fn needs its own transport timeout;
+when every worker is busy, calls fail at once with GuardSaturatedError rather than queueing.
+Optionally (hedge_quantile), a call still running after the observed p95 gets a second
+(hedged) attempt, and whichever finishes first wins. An attempt that fails quickly with a
+transient error (is_transient: timeout, dropped connection, 5xx) is retried at once; other
+errors (4xx, rate limits, invalid arguments) are raised. Failures and timeouts feed a
+CircuitBreaker; while it is open, calls fail immediately with CircuitOpenError so callers
+can go straight to their fallbacks.
+"""
+import asyncio
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class GuardSaturatedError(RuntimeError):
+    """Raised instead of queueing when every worker is still busy with earlier attempts."""
+
+
+# Transport errors of requests / httpx, which don't derive from the builtin TimeoutError / ConnectionError
+_TRANSIENT_ERROR_NAMES = {"ConnectionError", "Timeout", "TimeoutException", "NetworkError", "RemoteProtocolError"}
+
+
+def is_transient(error):
+    """True if error is worth an immediate retry: a timeout, a dropped connection or a 5xx response."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "code", None)  # google-genai APIError
+    if not isinstance(status, int):
+        status = getattr(getattr(error, "response", None), "status_code", None)  # requests / httpx
+    if isinstance(status, int):
+        return status >= 500
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds; then lets a single probe call through (half-open) and closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def allow(self):
+        """True if a call may go ahead now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True  # Half-open: exactly one probe at a time
+            return True
+
+    def release_probe(self):
+        """Give back a half-open probe slot taken by allow() when the call never went out."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies (seconds)."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[max(math.ceil(q * len(samples)) - 1, 0)]  # Nearest-rank
+
+
+class CallGuard:
+    """
+    Deadline + hedging + circuit breaker around one upstream dependency.
+
+    timeout: seconds a call may take in total (hedges included) before TimeoutError.
+    hedge_quantile: start a hedged attempt once a call has run longer than this latency
+        quantile (e.g. 0.95); None (the default) disables hedging, which costs a duplicate
+        upstream call each time it fires. Needs `hedge_min_samples` observations first.
+    max_attempts: attempts per call, counting hedges and retries after quick errors.
+    max_workers: attempts that may run at once; beyond that calls raise GuardSaturatedError.
+    retry_on: error -> bool, whether a failed attempt is retried at once (default is_transient;
+        None never retries).
+    """
+
+    def __init__(self, timeout=8.0, hedge_quantile=None, hedge_min_samples=20, max_attempts=2,
+                 breaker=None, max_workers=16, retry_on=is_transient):
+        self.timeout = timeout
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_attempts = max_attempts
+        self.max_workers = max_workers
+        self.retry_on = retry_on
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        # Timed-out calls can't be interrupted; they finish on this pool and their results are dropped
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+        self._free_workers = threading.BoundedSemaphore(max_workers)
+
+    def _hedge_after(self):
+        if self.hedge_quantile is None or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    def _submit(self, fn, *args):
+        """Run fn on a free worker, or return None if all of them are busy (never queue behind hung calls)."""
+        if not self._free_workers.acquire(blocking=False):
+            return None
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                self._free_workers.release()
+
+        future = self.executor.submit(run)
+        # A future cancelled before a worker picked it up never runs `run`, so release here instead
+        future.add_done_callback(lambda f: f.cancelled() and self._free_workers.release())
+        return future
+
+    def _should_retry(self, error):
+        return error is not None and self.retry_on is not None and self.retry_on(error)
+
+    def _timed(self, fn, args):
+        start = time.monotonic()
+        result = fn(*args)
+        return result, time.monotonic() - start
+
+    def call(self, fn, *args, timeout=None):
+        """
+        fn(*args) within the latency budget. Raises CircuitOpenError, GuardSaturatedError,
+        TimeoutError or fn's error (after one immediate retry if it was transient).
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuit open")
+        first = self._submit(self._timed, fn, args)
+        if first is None:
+            self.breaker.release_probe()
+            raise GuardSaturatedError("all upstream workers busy")
+        start = time.monotonic()
+        deadline = start + (timeout or self.timeout)
+        hedge_after = self._hedge_after()
+
+        pending = {first}
+        attempts, error = 1, None
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wake = deadline
+            if hedge_after is not None and attempts < self.max_attempts:
+                wake = min(wake, start + hedge_after * attempts)
+            done, pending = wait(pending, timeout=wake - now, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    result, seconds = future.result()
+                    self.latency.record(seconds)
+                    self.breaker.record_success()
+                    for other in pending:
+                        other.cancel()
+                    return result
+                error = future.exception()
+
+            # Hedge a slow call, or retry at once if every attempt so far has failed transiently
+            hedge_due = hedge_after is not None and time.monotonic() >= start + hedge_after * attempts
+            retry = not pending and self._should_retry(error)
+            if attempts < self.max_attempts and (retry or (pending and hedge_due)):
+                extra = self._submit(self._timed, fn, args)
+                if extra is not None:
+                    pending.add(extra)
+                attempts += 1  # A skipped attempt (no free worker) still uses up the budget
+                if not pending:
+                    break
+            elif not pending:
+                break
+
+        for future in pending:
+            future.cancel()
+        self.breaker.record_failure()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"no response within {deadline - start:.1f}s")
+
+    async def call_async(self, fn, *args, timeout=None):
+        """Async call(): fn(*args) is a coroutine function; losing attempts are cancelled."""
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuit open")
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + (timeout or self.timeout)
+        hedge_after = self._hedge_after()
+
+        async def timed():
+            attempt_start = loop.time()
+            result = await fn(*args)
+            return result, loop.time() - attempt_start
+
+        pending = {asyncio.ensure_future(timed())}
+        attempts, error = 1, None
+        try:
+            while True:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                wake = deadline
+                if hedge_after is not None and attempts < self.max_attempts:
+                    wake = min(wake, start + hedge_after * attempts)
+                done, pending = await asyncio.wait(pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is None:
+                        result, seconds = task.result()
+                        self.latency.record(seconds)
+                        self.breaker.record_success()
+                        return result
+                    error = task.exception()
+
+                hedge_due = hedge_after is not None and loop.time() >= start + hedge_after * attempts
+                retry = not pending and self._should_retry(error)
+                if attempts < self.max_attempts and (retry or (pending and hedge_due)):
+                    pending.add(asyncio.ensure_future(timed()))
+                    attempts += 1
+                elif not pending:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.breaker.record_failure()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"no response within {deadline - start:.1f}s")
+
+    def stream(self, make_stream, timeout=None, first_chunk_timeout=None):
+        """
+        Iterate make_stream() within the budget: the first chunk must arrive within
+        first_chunk_timeout (default: timeout) and the whole stream within timeout.
+        Streams are not hedged, since output may already have been shown.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("circuit open")
+        start = time.monotonic()
+        deadline = start + (timeout or self.timeout)
+        first_deadline = min(deadline, start + (first_chunk_timeout or self.timeout))
+
+        chunks = queue.Queue()
+        stop = threading.Event()
+        end = object()
+
+        def pump():
+            try:
+                for chunk in make_stream():
+                    if stop.is_set():
+                        return
+                    chunks.put((chunk, None))
+                chunks.put((end, None))
+            except Exception as e:
+                chunks.put((None, e))
+
+        if self._submit(pump) is None:
+            self.breaker.release_probe()
+            raise GuardSaturatedError("all upstream workers busy")
+        received = settled = False
+        try:
+            while True:
+                remaining = (deadline if received else first_deadline) - time.monotonic()
+                try:
+                    chunk, error = chunks.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    settled = True
+                    self.breaker.record_failure()
+                    raise TimeoutError(f"stream stalled after {time.monotonic() - start:.1f}s") from None
+                if error is not None:
+                    settled = True
+                    self.breaker.record_failure()
+                    raise error
+                if chunk is end:
+                    settled = True
+                    self.breaker.record_success()
+                    return
+                received = True
+                yield chunk
+        finally:
+            stop.set()
+            if not settled:
+                # Consumer stopped early: upstream was responding if anything had arrived
+                if received:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
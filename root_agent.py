@@ -1,147 +1,512 @@
+import asyncio
+import copy
+import logging
 import os
+from array import array
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from lazy import Lazy, run_in_background
+import metrics
+from description_cache import description_key
+from description_prefetcher import DescriptionPrefetcher
+from query_parser import QueryParser
+from resilience import CallGuard, CircuitOpenError, GuardSaturatedError
+
+logger = logging.getLogger(__name__)
+
 
 class RootAgent:
     """Handles conversation, trail selection, weather, and nearby pubs/cafes via Gemini and OSM."""
 
-    def __init__(self, planner_agent, data_agent, communicator_agent, model_name="gemini-2.5-flash"):
-        load_dotenv(dotenv_path="./.env")
+    TRAIL_DESCRIPTION_PROMPT = (
+        "You are a friendly, enthusiastic hiking guide. "
+        "Write 3–5 cheerful, natural sentences describing the trail below. "
+        "Include the 'Views' and 'Route' details naturally in the description — "
+        "do not just list them. Add small friendly touches like 'perfect for photos' or 'great for a morning hike'.\n\n"
+        "Trail details:\n"
+        "Name: {name}\n"
+        "Difficulty: {difficulty}\n"
+        "Distance (km): {distance}\n"
+        "Views: {views}\n"
+        "Route: {route}\n"
+        "Fell height: {fell}\n\n"
+        "Write your paragraph below:"
+    )
+
+    MAX_RESULTS = 50  # Trail ids kept per search
+    PAGE_SIZE = 10  # Trails listed per message; "more" shows the next page
+    MORE_COMMANDS = ("more", "show more", "next")  # Replies that ask for the next page of trails
+    NAME_MATCH_MARGIN = 0.1  # Name matches scoring this close to the best one are too close to call
+
+    def __init__(self, planner_agent, data_agent, communicator_agent, model_name="gemini-2.5-flash",
+                 description_cache=None, description_artifact=None, prefetch_top_n=0, client=None,
+                 gemini_guard=None, prefetch_guard=None, lazy=False):
+        """
+        lazy: don't import google.genai or build the Gemini client until the first Gemini call
+        (or warm_up()); the API key is still checked here.
+        """
+        # Deadline, breaker and (opt-in) hedging for every Gemini call (shared by forked sessions)
+        self.gemini_guard = gemini_guard or CallGuard(timeout=8.0)
+        if client is None:
+            api_key = self._api_key()
+            # Shared by forked sessions, so the client is built once however many sessions exist
+            self._client = Lazy(lambda: self._new_client(api_key, self.gemini_guard.timeout))
+            if not lazy:
+                self._client.get()
+        else:
+            self._client = Lazy.of(client)
+        self.model = model_name
+
+        self.planner_agent = planner_agent
+        self.data_agent = data_agent
+        self.communicator_agent = communicator_agent
+        self.description_cache = description_cache  # Optional DescriptionCache
+        self.description_artifact = description_artifact  # Optional pre-generated DescriptionArtifact
+
+        # Speculatively describe the top-N listed trails while the user is choosing (0 = off).
+        # Prefetch calls get their own worker budget (same breaker), so they can't use up
+        # the workers interactive Gemini calls need
+        self.description_prefetcher = None
+        self.prefetch_guard = prefetch_guard
+        if prefetch_top_n:
+            if prefetch_guard is None:
+                self.prefetch_guard = CallGuard(timeout=self.gemini_guard.timeout, breaker=self.gemini_guard.breaker,
+                                                max_workers=prefetch_top_n)
+            self.description_prefetcher = DescriptionPrefetcher(self._prefetch_description, top_n=prefetch_top_n)
+
+        self.state = self._initial_state()
+
+        self.weather_prefetcher = None  # Background WeatherPrefetcher, set by main.start_background()
+        # httpx.AsyncClient for the async path, created on first use and shared by forked sessions
+        self._async_http = Lazy(self._new_async_http)
+
+    @staticmethod
+    def _api_key():
         API_KEY = os.getenv("GEMINI_API_KEY")
+        if not API_KEY:
+            load_dotenv(dotenv_path="./.env")  # Not already loaded by the caller
+            API_KEY = os.getenv("GEMINI_API_KEY")
         if not API_KEY or API_KEY == "YOUR_API_KEY_HERE":
             raise ValueError(
                 "GEMINI_API_KEY not found or still a placeholder. "
                 "Please set your real key in .env"
             )
-
-        self.client = genai.Client(api_key=API_KEY)
-        self.model = model_name
-
-        self.planner_agent = planner_agent
-        self.data_agent = data_agent
-        self.communicator_agent = communicator_agent
-
-        self.state = {
+        return API_KEY
+
+    @staticmethod
+    def _new_client(api_key, timeout):
+        """
+        genai.Client whose HTTP requests give up after `timeout` seconds. Without that (the SDK
+        default is no timeout) an attempt the guard abandons would hold its worker thread forever.
+        """
+        from google import genai  # Takes about half a second to import, so only when first needed
+        from google.genai import types
+        return genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+
+    @property
+    def client(self):
+        """The Gemini client, built on first use in lazy mode."""
+        return self._client.get()
+
+    @client.setter
+    def client(self, client):
+        self._client = Lazy.of(client)
+
+    @staticmethod
+    def _new_async_http():
+        import httpx  # Only the async path uses it
+        return httpx.AsyncClient()
+
+    @property
+    def async_http(self):
+        """The httpx.AsyncClient the async path uses when the caller doesn't pass one."""
+        return self._async_http.get()
+
+    async def aclose(self):
+        """Close the shared async HTTP client, if it was ever built (closes it for every forked session)."""
+        if self._async_http.ready:
+            await self._async_http.get().aclose()
+
+    def warm_up(self, *then):
+        """
+        Build everything the first real turns need on a background thread: the trail catalog
+        and query parser, the Gemini client, the POI extract, the weather HTTP session and the
+        pre-generated description index.
+        then: further steps to run once those are ready (e.g. starting background refreshers).
+        """
+        steps = [
+            self.planner_agent.warm_up,
+            lambda: self.client,
+            lambda: self.communicator_agent.poi_index,
+            lambda: self.data_agent.session,
+        ]
+        if self.description_artifact is not None:
+            steps.append(self.description_artifact.warm_up)
+        return run_in_background(*steps, *then)
+
+    @staticmethod
+    def _initial_state():
+        return {
             "awaiting_input": "difficulty_choice",
             "difficulty": None,
             "max_distance": None,
-            "trail_options": [],
-            "selected_trail": None
+            "catalog": None,  # The TrailStore the ids below refer to (survives catalog hot reloads)
+            "trail_options": array("l"),  # Ids of the search results, best first
+            "page": 0,  # Page of trail_options currently shown
+            "filters": None,  # Extra TrailStore.filter() criteria parsed from the user's message
+            "origin": None,  # (lat, lng) of a place the user asked to walk near
+            "place": None,  # Its name
+            "amenity": None,  # "pub" or "cafe" if the user already said which they want
+            "selected_trail": None,  # Trail id
+            "nearby_places": None  # Speculative pub/cafe results fetched during the weather turn
         }
 
+    def fork(self):
+        """
+        A new conversation sharing this agent's Gemini client, HTTP clients, caches and
+        trail catalog. Only the conversation state (and speculative prefetch slots) are its own.
+        """
+        session = copy.copy(self)
+        session.state = self._initial_state()
+        if self.description_prefetcher is not None:
+            session.description_prefetcher = DescriptionPrefetcher(
+                session._prefetch_description,
+                top_n=self.description_prefetcher.top_n,
+                executor=self.description_prefetcher.executor,
+                max_wait=self.description_prefetcher.max_wait
+            )
+        return session
+
     # ------------------------------
     # Gemini wrapper
     # ------------------------------
-    def ask_gemini(self, prompt, max_output_tokens=500):
-        """Call Gemini generate_content API to produce text."""
-        try:
-            response = self.client.models.generate_content(
+    def _generate(self, prompt, max_output_tokens):
+        """One Gemini call; returns (text, token usage)."""
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._generation_config(max_output_tokens)
+        )
+        if response and hasattr(response, "text") and response.text:
+            return response.text.strip(), self._token_usage(response)
+        return "", self._token_usage(response)
+
+    @staticmethod
+    def _generation_config(max_output_tokens):
+        from google.genai import types  # Kept out of module import time, like the client
+        return types.GenerateContentConfig(max_output_tokens=max_output_tokens)
+
+    @staticmethod
+    def _token_usage(response):
+        """Prompt and output token counts from a Gemini response's usage_metadata (empty if absent)."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return {}
+        return {"prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+                "output_tokens": getattr(usage, "candidates_token_count", None) or 0}
+
+    @staticmethod
+    def _record_usage(span, usage):
+        span.set(**usage)
+        for kind in ("prompt", "output"):
+            if usage.get(f"{kind}_tokens"):
+                metrics.count("gemini_tokens_total", usage[f"{kind}_tokens"], kind=kind)
+
+    def ask_gemini(self, prompt, max_output_tokens=500, guard=None):
+        """
+        Call Gemini generate_content API to produce text, within gemini_guard's latency budget
+        (or guard's, e.g. prefetch_guard for speculative calls).
+        Returns "" on error, timeout, an open circuit breaker or a saturated guard, so callers use their fallbacks.
+        """
+        with metrics.span("gemini") as span:
+            try:
+                text, usage = (guard or self.gemini_guard).call(self._generate, prompt, max_output_tokens)
+                self._record_usage(span, usage)
+                return text
+            except CircuitOpenError:
+                metrics.count("gemini_circuit_open_total")
+                logger.debug("Gemini circuit open, using fallback")
+            except GuardSaturatedError:
+                metrics.count("gemini_saturated_total")
+                logger.debug("No free Gemini worker, using fallback")
+            except Exception as e:
+                metrics.count("upstream_errors_total", service="gemini")
+                logger.warning("Gemini error: %s", e)
+        return ""
+
+    async def _generate_async(self, prompt, max_output_tokens):
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._generation_config(max_output_tokens)
+        )
+        if response and hasattr(response, "text") and response.text:
+            return response.text.strip(), self._token_usage(response)
+        return "", self._token_usage(response)
+
+    async def ask_gemini_async(self, prompt, max_output_tokens=500):
+        """Async ask_gemini using the client's asyncio API."""
+        with metrics.span("gemini") as span:
+            try:
+                text, usage = await self.gemini_guard.call_async(self._generate_async, prompt, max_output_tokens)
+                self._record_usage(span, usage)
+                return text
+            except CircuitOpenError:
+                metrics.count("gemini_circuit_open_total")
+                logger.debug("Gemini circuit open, using fallback")
+            except GuardSaturatedError:
+                metrics.count("gemini_saturated_total")
+                logger.debug("No free Gemini worker, using fallback")
+            except Exception as e:
+                metrics.count("upstream_errors_total", service="gemini")
+                logger.warning("Gemini error: %s", e)
+        return ""
+
+    def ask_gemini_stream(self, prompt, max_output_tokens=500):
+        """
+        Yield text chunks from the Gemini streaming API as they arrive. Errors propagate, including
+        TimeoutError when the stream stalls past the budget, CircuitOpenError while the breaker is open
+        and GuardSaturatedError when no worker is free.
+        """
+        def open_stream():
+            return self.client.models.generate_content_stream(
                 model=self.model,
                 contents=prompt,
-                config=types.GenerateContentConfig(max_output_tokens=max_output_tokens)
+                config=self._generation_config(max_output_tokens)
             )
-            if response and hasattr(response, "text") and response.text:
-                return response.text.strip()
-            return ""
+
+        with metrics.span("gemini", mode="stream") as span:
+            usage = {}
+            for chunk in self.gemini_guard.stream(open_stream):
+                usage = self._token_usage(chunk) or usage  # The last chunk carries the totals
+                if chunk and getattr(chunk, "text", None):
+                    yield chunk.text
+            self._record_usage(span, usage)
+
+    def _stream_with_fallback(self, prompt, fallback, on_complete=None, max_output_tokens=500):
+        """
+        Stream Gemini output, ending with the fallback text if the stream fails or is empty.
+        on_complete(text) is called with the full response when the stream finishes cleanly.
+        """
+        parts = []
+        try:
+            for chunk in self.ask_gemini_stream(prompt, max_output_tokens=max_output_tokens):
+                parts.append(chunk)
+                yield chunk
+        except CircuitOpenError:
+            metrics.count("gemini_circuit_open_total")
+            logger.debug("Gemini circuit open, using fallback")
+        except GuardSaturatedError:
+            metrics.count("gemini_saturated_total")
+            logger.debug("No free Gemini worker, using fallback")
         except Exception as e:
-            print("DEBUG — Gemini error:", e)
-            return ""
+            metrics.count("upstream_errors_total", service="gemini")
+            logger.warning("Gemini stream error: %s", e)
+        else:
+            text = "".join(parts).strip()
+            if text:
+                if on_complete is not None:
+                    on_complete(text)
+                return
+        # Already-printed partial output can't be taken back, so the fallback follows it
+        yield ("\n\n" if parts else "") + fallback
 
     # ------------------------------
     # Trail description using Gemini
     # ------------------------------
+    @classmethod
+    def build_description_prompt(cls, trail):
+        """Fill the trail description prompt template from a trail row."""
+        return cls.TRAIL_DESCRIPTION_PROMPT.format(**cls._description_fields(trail))
+
+    @staticmethod
+    def _description_fields(trail):
+        return {
+            "name": str(trail.get("Trail", "Unknown")),
+            "difficulty": str(trail.get("Difficulty", "Unknown")),
+            "distance": str(trail.get("Distance_km", "Unknown")),
+            "views": str(trail.get("Views", "N/A")),
+            "route": str(trail.get("Route", "N/A")),
+            "fell": str(trail.get("Fell_Height") or "N/A"),
+        }
+
+    def _stored_description(self, trail):
+        """Look the trail up in the pre-generated artifact, then the cache. Returns (cache_key, text or None)."""
+        if self.description_artifact is None and self.description_cache is None:
+            return None, None
+        cache_key = description_key(trail, self.TRAIL_DESCRIPTION_PROMPT, self.model)
+        if self.description_artifact is not None:
+            pregenerated = self.description_artifact.get(cache_key)
+            if pregenerated:
+                metrics.count("description_cache_total", result="artifact")
+                return cache_key, pregenerated
+        if self.description_cache is not None:
+            cached = self.description_cache.get(cache_key)
+            if cached:
+                metrics.count("description_cache_total", result="cache")
+                return cache_key, cached
+        metrics.count("description_cache_total", result="miss")
+        return cache_key, None
+
     def generate_trail_description(self, trail):
-        name = str(trail.get("Trail", "Unknown"))
-        difficulty = str(trail.get("Difficulty", "Unknown"))
-        distance = str(trail.get("Distance_km", "Unknown"))
-        views = str(trail.get("Views", "N/A"))
-        route = str(trail.get("Route", "N/A"))
-        fell = str(trail.get("Fell_Height") or "N/A")
+        return self._describe(trail) or self.fallback_description(trail)
 
-        prompt = (
-            "You are a friendly, enthusiastic hiking guide. "
-            "Write 3–5 cheerful, natural sentences describing the trail below. "
-            "Include the 'Views' and 'Route' details naturally in the description — "
-            "do not just list them. Add small friendly touches like 'perfect for photos' or 'great for a morning hike'.\n\n"
-            f"Trail details:\n"
-            f"Name: {name}\n"
-            f"Difficulty: {difficulty}\n"
-            f"Distance (km): {distance}\n"
-            f"Views: {views}\n"
-            f"Route: {route}\n"
-            f"Fell height: {fell}\n\n"
-            "Write your paragraph below:"
-        )
+    def _prefetch_description(self, trail):
+        """Speculative description on prefetch_guard's workers; None (not the fallback) if Gemini didn't answer."""
+        return self._describe(trail, guard=self.prefetch_guard)
+
+    def _describe(self, trail, guard=None):
+        # Pre-generated artifact first, then the runtime cache, and only then Gemini
+        cache_key, stored = self._stored_description(trail)
+        if stored:
+            return stored
 
-        response = self.ask_gemini(prompt, max_output_tokens=500)
+        prompt = self.build_description_prompt(trail)
+        response = self.ask_gemini(prompt, max_output_tokens=500, guard=guard)
         if response:
+            if self.description_cache is not None:
+                self.description_cache.put(cache_key, response)
             return response
+        return None
 
+    async def generate_trail_description_async(self, trail):
+        cache_key, stored = self._stored_description(trail)
+        if stored:
+            return stored
+
+        response = await self.ask_gemini_async(self.build_description_prompt(trail), max_output_tokens=500)
+        if response:
+            if self.description_cache is not None:
+                self.description_cache.put(cache_key, response)
+            return response
+
+        return self.fallback_description(trail)
+
+    def stream_trail_description(self, trail):
+        """Streaming version of generate_trail_description: yields the description in chunks."""
+        cache_key, stored = self._stored_description(trail)
+        if stored:
+            yield stored
+            return
+
+        on_complete = None
+        if self.description_cache is not None:
+            on_complete = lambda text: self.description_cache.put(cache_key, text)
+        yield from self._stream_with_fallback(
+            self.build_description_prompt(trail), self.fallback_description(trail), on_complete=on_complete
+        )
+
+    def fallback_description(self, trail):
+        """Template description used when Gemini returns nothing."""
+        f = self._description_fields(trail)
         return (
-            f"{name} is a {difficulty.lower()} trail, {distance} km long, "
-            f"with views such as {views}. Route: {route}. Fell height: {fell} ft."
+            f"{f['name']} is a {f['difficulty'].lower()} trail, {f['distance']} km long, "
+            f"with views such as {f['views']}. Route: {f['route']}. Fell height: {f['fell']} ft."
         )
 
     # ------------------------------
     # Conversation flow
     # ------------------------------
-    def handle_user_message(self, user_msg):
+    def handle_user_message(self, user_msg, stream=False):
+        """
+        Advance the conversation and return the reply.
+        stream=True returns a generator of text chunks instead, so Gemini output can be
+        shown as it arrives.
+        """
+        trace = metrics.start_trace("turn", state=self.state["awaiting_input"] or "done")
+        if trace is None:
+            reply = self._handle_user_message(user_msg, stream)
+        else:
+            with trace.activate():
+                reply = self._handle_user_message(user_msg, stream)
+            if stream and not isinstance(reply, str):
+                return self._traced_stream(reply, trace)  # The turn ends when the stream does
+            trace.finish()
+        if stream and isinstance(reply, str):
+            return iter([reply])
+        return reply
+
+    @staticmethod
+    def _traced_stream(chunks, trace):
+        """Pass chunks through with the turn's trace active while each one is produced."""
+        try:
+            while True:
+                with trace.activate():
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            trace.finish()
+
+    @staticmethod
+    def _reply(stream, *parts):
+        """Join reply parts, or when streaming chain them (string parts and chunk iterators) into one generator."""
+        if not stream:
+            return "".join(parts)
+
+        def chunks():
+            for part in parts:
+                if isinstance(part, str):
+                    yield part
+                else:
+                    yield from part
+        return chunks()
+
+    def _handle_user_message(self, user_msg, stream):
         user_msg_lower = user_msg.strip().lower()
 
-        # --- 1: Difficulty choice ---
+        # --- 1: Difficulty choice (or a whole request in one message) ---
         if self.state["awaiting_input"] == "difficulty_choice":
-            for level in ["very easy", "easy", "moderate", "hard", "very hard"]:
-                if level in user_msg_lower:
-                    self.state["difficulty"] = level
-                    self.state["awaiting_input"] = "max_distance"
-                    return "Great! What’s the maximum distance you’d like to hike (in km)?"
-            return "Please choose your hiking difficulty level: Very Easy, Easy, Moderate, Hard or Very Hard."
+            self._remember_criteria(self.planner_agent.parse_query(user_msg))
+            if self.state["difficulty"] and self.state["max_distance"]:
+                return self._show_results()
+            if self.state["difficulty"]:
+                self.state["awaiting_input"] = "max_distance"
+                return "Great! What’s the maximum distance you’d like to hike (in km)?"
+            if self.state["max_distance"]:
+                return (
+                    f"Got it, up to {self.state['max_distance']:g} km. "
+                    "Which difficulty level would you like: Very Easy, Easy, Moderate, Hard or Very Hard?"
+                )
+            return (
+                "Please choose your hiking difficulty level: Very Easy, Easy, Moderate, Hard or Very Hard. "
+                "You can also describe the whole walk, e.g. 'moderate walk under 8km near Keswick with a pub'."
+            )
 
         # --- 2: Max distance ---
         if self.state["awaiting_input"] == "max_distance":
-            try:
-                distance = float(user_msg)
-                self.state["max_distance"] = distance
-
-                trails = self.planner_agent.get_trails_by_criteria(
-                    difficulty=self.state["difficulty"],
-                    max_distance=distance
-                )
-
-                self.state["trail_options"] = trails
-                self.state["awaiting_input"] = "trail_selection"
-
-                trail_list = "\n".join([f"{i+1}. {t['Trail']}" for i, t in enumerate(trails)])
-
-                return (
-                    f"Here are the trails I found within your criteria:\n{trail_list}\n\n"
-                    "Which trail catches your eye? You can type the number or the trail name."
-                )
-            except ValueError:
+            distance = self.planner_agent.parse_query(user_msg).get("max_distance")
+            if not distance:
                 return "Please enter a valid number for maximum distance."
+            self.state["max_distance"] = distance
+            return self._show_results()
 
         # --- 3: Trail selection ---
         if self.state["awaiting_input"] == "trail_selection":
-            trails = self.state["trail_options"]
-            selected = None
-
-            if user_msg_lower.isdigit():
-                index = int(user_msg_lower) - 1
-                if 0 <= index < len(trails):
-                    selected = trails[index]
-            else:
-                for t in trails:
-                    if t["Trail"].lower() == user_msg_lower:
-                        selected = t
-                        break
-
-            if selected:
-                self.state["selected_trail"] = selected
+            if user_msg_lower in self.MORE_COMMANDS:
+                if (self.state["page"] + 1) * self.PAGE_SIZE >= len(self.state["trail_options"]):
+                    return "That's all the trails I found. Please choose one from the list."
+                self.state["page"] += 1
+                return self._trail_page("Here are some more trails:", "Which trail catches your eye?")
+
+            candidates = self._match_trail_options(user_msg_lower)
+            if len(candidates) > 1:
+                return self._ask_which_trail(candidates)
+
+            if candidates:
+                selected = candidates[0]
+                self.state["selected_trail"] = selected.id
                 self.state["awaiting_input"] = "confirm_selection"
 
-                description = self.generate_trail_description(selected)
-                return f"{description}\n\nWould you like to select this trail or explore another one?"
+                description = None
+                if self.description_prefetcher is not None:
+                    description = self.description_prefetcher.take(selected)
+                if description is None:
+                    if stream:
+                        description = self.stream_trail_description(selected)
+                    else:
+                        description = self.generate_trail_description(selected)
+                return self._reply(stream, description, "\n\nWould you like to select this trail or explore another one?")
             else:
                 return "Sorry, I didn’t recognize that trail. Please choose one from the list."
 
@@ -149,50 +514,43 @@ class RootAgent:
         if self.state["awaiting_input"] == "confirm_selection":
             if user_msg_lower in ["yes", "select", "this one"]:
                 self.state["awaiting_input"] = "confirm_weather"
+                if self.description_prefetcher is not None:
+                    self.description_prefetcher.cancel()  # Other speculative descriptions won't be needed
                 return "Excellent choice! 🌄 Would you like the current weather for this trail?"
             elif user_msg_lower in ["no", "another", "explore another"]:
                 self.state["awaiting_input"] = "trail_selection"
-                trail_list = "\n".join([f"{i+1}. {t['Trail']}" for i, t in enumerate(self.state["trail_options"])])
-                return (
-                    f"No problem! Here are the options again:\n{trail_list}\n\n"
-                    "Which trail would you like to explore?"
-                )
+                return self._trail_page("No problem! Here are the options again:",
+                                        "Which trail would you like to explore?", prefetch=False)
             else:
                 return "Please answer yes/no or say 'another'."
 
         # --- 5: Weather ---
         if self.state["awaiting_input"] == "confirm_weather":
             if user_msg_lower in ["yes", "y"]:
-                trail = self.state["selected_trail"]
+                trail = self._selected_trail()
                 lat = trail.get("Lat")
                 lon = trail.get("Lng")
 
                 weather = self.data_agent.get_weather(lat, lon)
-                weather_desc = self.data_agent.map_weather_code(weather["weather_code"])
-
-                summary = (
-                    f"Temperature: {weather['temperature']}°C, "
-                    f"Wind speed: {weather['windspeed']} km/h, "
-                    f"Condition: {weather_desc}"
-                )
-
-                prompt = (
-                    f"You are a friendly hiking assistant. "
-                    f"Here is the current weather at {trail['Trail']}: {summary}. "
-                    "Write a short, cheerful message to tell the user."
-                )
-
-                friendly_weather = self.ask_gemini(prompt)
-
-                if not friendly_weather:
-                    friendly_weather = (
-                        f"Hey! 🌤️ The weather at {trail['Trail']} is {weather_desc}, "
-                        f"with a temperature of {weather['temperature']}°C and winds at {weather['windspeed']} km/h."
-                    )
+                prompt, fallback = self._weather_prompt(trail, weather)
+                if stream:
+                    friendly_weather = self._stream_with_fallback(prompt, fallback)
+                else:
+                    friendly_weather = self.ask_gemini(prompt) or fallback
+
+                amenity = self.state["amenity"]
+                if amenity:
+                    # Already asked for in the first message: list them straight away
+                    places = self.communicator_agent.get_nearby_pubs_cafes(lat, lon, place_type=amenity, radius_km=5)
+                    self.state["awaiting_input"] = None
+                    return self._reply(stream, friendly_weather, "\n\n" + self._format_places(amenity, places))
 
                 # Ask about pubs or cafes
                 self.state["awaiting_input"] = "pub_or_cafe_choice"
-                return f"{friendly_weather}\n\nWould you like a list of the nearest pubs or cafes to {trail['Trail']}?"
+                return self._reply(
+                    stream, friendly_weather,
+                    f"\n\nWould you like a list of the nearest pubs or cafes to {trail['Trail']}?"
+                )
 
             else:
                 self.state["awaiting_input"] = None
@@ -200,7 +558,7 @@ class RootAgent:
 
         # --- 6: Pubs or cafes selection ---
         if self.state["awaiting_input"] == "pub_or_cafe_choice":
-            trail = self.state["selected_trail"]
+            trail = self._selected_trail()
             lat = trail.get("Lat")
             lon = trail.get("Lng")
 
@@ -215,12 +573,215 @@ class RootAgent:
             )
 
             self.state["awaiting_input"] = None
-
-            if not places:
-                return f"No nearby {user_msg_lower}s found within 2 km."
-
-            formatted = [f"{i+1}. {p['name']} – {p['distance_km']} km" for i, p in enumerate(places)]
-            return f"Here are some nearby {user_msg_lower}s:\n" + "\n".join(formatted)
+            return self._format_places(user_msg_lower, places)
 
         # --- Default fallback ---
         return "I'm not sure how to respond to that. Please follow the prompts."
+
+    # ------------------------------
+    # Conversation helpers
+    # ------------------------------
+    def _remember_criteria(self, criteria):
+        """Store parsed search criteria in the conversation state."""
+        for key in ("difficulty", "max_distance", "origin", "place", "amenity"):
+            if criteria.get(key):
+                self.state[key] = criteria[key]
+        filters = {key: criteria[key] for key in ("region", "classification", "suitable_for", "max_duration")
+                   if key in criteria}
+        if filters:
+            self.state["filters"] = filters
+
+    def _show_results(self):
+        """Search with the criteria gathered so far and list the first page of results."""
+        trails = self.planner_agent.get_trails_by_criteria(
+            difficulty=self.state["difficulty"],
+            max_distance=self.state["max_distance"],
+            origin=self.state["origin"],
+            radius_km=QueryParser.PLACE_RADIUS_KM,
+            limit=self.MAX_RESULTS,
+            filters=self.state["filters"]
+        )
+        intro = "Here are the trails I found within your criteria:"
+        if self.state["place"]:
+            intro = f"Here are the trails I found near {self.state['place']}:"
+        if isinstance(trails, dict):  # No match: the planner suggests the closest trails instead
+            intro, trails = trails["message"], trails["trails"]
+
+        self.state["catalog"] = trails[0].store if trails else self.planner_agent.store
+        self.state["trail_options"] = array("l", (t.id for t in trails))
+        self.state["page"] = 0
+        self.state["awaiting_input"] = "trail_selection"
+
+        return self._trail_page(
+            intro, "Which trail catches your eye? You can type the number or the trail name."
+        )
+
+    def _trail_page(self, intro, question, prefetch=True):
+        """
+        List the current page of results, numbered across the whole result list.
+        prefetch: start describing the page's top trails speculatively (skipped when re-showing it).
+        """
+        start = self.state["page"] * self.PAGE_SIZE
+        store = self.state["catalog"]
+        page = [store[trail_id] for trail_id in self.state["trail_options"][start:start + self.PAGE_SIZE]]
+
+        if prefetch and self.description_prefetcher is not None:
+            self.description_prefetcher.prefetch(page)
+
+        trail_list = "\n".join(f"{start + i + 1}. {t['Trail']}" for i, t in enumerate(page))
+        if start + self.PAGE_SIZE < len(self.state["trail_options"]):
+            question += " Or type 'more' to see more trails."
+        return f"{intro}\n{trail_list}\n\n{question}"
+
+    def _selected_trail(self):
+        return self.state["catalog"][self.state["selected_trail"]]
+
+    def _match_trail_options(self, user_msg_lower):
+        """
+        Trails the user may mean: a list number, or a full, partial or misspelt trail name matched
+        against the current options. When the best name matches score within NAME_MATCH_MARGIN
+        of each other (e.g. "crag" for Helm Crag and Walla Crag) they are all returned, in list
+        order, for the user to choose between; an exact name wins outright.
+        """
+        options = self.state["trail_options"]
+        if user_msg_lower.isdigit():
+            index = int(user_msg_lower) - 1
+            if 0 <= index < len(options):
+                return [self.state["catalog"][options[index]]]
+            return []
+
+        store = self.state["catalog"]
+        matches = store.name_index.search(user_msg_lower, ids=options) if store is not None else []
+        if not matches:
+            return []
+        top_score = matches[0][1]
+        cutoff = top_score if top_score >= 1.0 else top_score - self.NAME_MATCH_MARGIN
+        close = {trail_id for trail_id, score in matches if score >= cutoff}
+        return [store[trail_id] for trail_id in options if trail_id in close]
+
+    def _ask_which_trail(self, candidates):
+        """Ask the user to choose between trails their reply matched equally well."""
+        options = self.state["trail_options"]
+        numbered = "\n".join(f"{options.index(t.id) + 1}. {t['Trail']}" for t in candidates)
+        return f"A few trails match that:\n{numbered}\n\nWhich one did you mean? You can type the number or the full name."
+
+    def _weather_prompt(self, trail, weather):
+        """Gemini prompt and template fallback text for a weather reading."""
+        weather_desc = self.data_agent.map_weather_code(weather["weather_code"])
+
+        summary = (
+            f"Temperature: {weather['temperature']}°C, "
+            f"Wind speed: {weather['windspeed']} km/h, "
+            f"Condition: {weather_desc}"
+        )
+
+        prompt = (
+            f"You are a friendly hiking assistant. "
+            f"Here is the current weather at {trail['Trail']}: {summary}. "
+            "Write a short, cheerful message to tell the user."
+        )
+
+        fallback = (
+            f"Hey! 🌤️ The weather at {trail['Trail']} is {weather_desc}, "
+            f"with a temperature of {weather['temperature']}°C and winds at {weather['windspeed']} km/h."
+        )
+        return prompt, fallback
+
+    @staticmethod
+    def _format_places(place_type, places):
+        if not places:
+            return f"No nearby {place_type}s found within 5 km."
+
+        formatted = [f"{i+1}. {p['name']} – {p['distance_km']} km" for i, p in enumerate(places)]
+        return f"Here are some nearby {place_type}s:\n" + "\n".join(formatted)
+
+    # ------------------------------
+    # Async conversation flow
+    # ------------------------------
+    async def handle_user_message_async(self, user_msg, http=None):
+        """
+        Async handle_user_message: Gemini, Open-Meteo and Overpass calls are awaited on a
+        shared httpx.AsyncClient instead of blocking, so one event loop can serve many
+        conversations. Turns without external I/O run the regular state machine.
+        """
+        trace = metrics.start_trace("turn", state=self.state["awaiting_input"] or "done", mode="async")
+        if trace is None:
+            return await self._handle_user_message_async(user_msg, http)
+        with trace.activate():
+            try:
+                return await self._handle_user_message_async(user_msg, http)
+            finally:
+                trace.finish()
+
+    async def _handle_user_message_async(self, user_msg, http):
+        if http is None:
+            http = self.async_http
+        user_msg_lower = user_msg.strip().lower()
+
+        # --- 3: Trail selection (paging is handled by the regular state machine) ---
+        if self.state["awaiting_input"] == "trail_selection" and user_msg_lower not in self.MORE_COMMANDS:
+            candidates = self._match_trail_options(user_msg_lower)
+            if len(candidates) == 1:  # No match or several: the regular state machine replies
+                selected = candidates[0]
+                self.state["selected_trail"] = selected.id
+                self.state["awaiting_input"] = "confirm_selection"
+
+                description = None
+                prefetcher = self.description_prefetcher
+                future = prefetcher.in_flight(selected) if prefetcher is not None else None
+                if future is not None:
+                    try:
+                        description = await asyncio.wait_for(asyncio.wrap_future(future), prefetcher.max_wait)
+                    except Exception:
+                        description = None
+                if description is None:
+                    description = await self.generate_trail_description_async(selected)
+                return f"{description}\n\nWould you like to select this trail or explore another one?"
+
+        # --- 5: Weather ---
+        if self.state["awaiting_input"] == "confirm_weather" and user_msg_lower in ["yes", "y"]:
+            trail = self._selected_trail()
+            lat = trail.get("Lat")
+            lon = trail.get("Lng")
+
+            # Weather plus a speculative pub and cafe lookup for the next turn, all at once
+            weather, pubs, cafes = await asyncio.gather(
+                self.data_agent.get_weather_async(lat, lon, http),
+                self.communicator_agent.get_nearby_pubs_cafes_async(lat, lon, http, place_type="pub", radius_km=5),
+                self.communicator_agent.get_nearby_pubs_cafes_async(lat, lon, http, place_type="cafe", radius_km=5),
+                return_exceptions=True
+            )
+            if isinstance(weather, Exception):
+                weather = {"temperature": "N/A", "windspeed": "N/A", "weather_code": "N/A"}
+            self.state["nearby_places"] = {
+                place_type: places for place_type, places in (("pub", pubs), ("cafe", cafes))
+                if not isinstance(places, Exception)
+            }
+
+            prompt, fallback = self._weather_prompt(trail, weather)
+            friendly_weather = await self.ask_gemini_async(prompt) or fallback
+
+            amenity = self.state["amenity"]
+            if amenity and amenity in self.state["nearby_places"]:
+                places = self.state["nearby_places"][amenity]
+                self.state["awaiting_input"] = None
+                self.state["nearby_places"] = None
+                return f"{friendly_weather}\n\n{self._format_places(amenity, places)}"
+
+            self.state["awaiting_input"] = "pub_or_cafe_choice"
+            return f"{friendly_weather}\n\nWould you like a list of the nearest pubs or cafes to {trail['Trail']}?"
+
+        # --- 6: Pubs or cafes selection ---
+        if self.state["awaiting_input"] == "pub_or_cafe_choice" and user_msg_lower in ["pub", "cafe"]:
+            trail = self._selected_trail()
+            places = (self.state["nearby_places"] or {}).get(user_msg_lower)
+            if places is None:
+                places = await self.communicator_agent.get_nearby_pubs_cafes_async(
+                    trail.get("Lat"), trail.get("Lng"), http, place_type=user_msg_lower, radius_km=5
+                )
+
+            self.state["awaiting_input"] = None
+            self.state["nearby_places"] = None
+            return self._format_places(user_msg_lower, places)
+
+        return self._handle_user_message(user_msg, stream=False)
@@ -0,0 +1,256 @@
+"""
+Multi-session conversation server.
+
+Every conversation is a RootAgent.fork() of one template agent, so all sessions share the
+trail catalog, caches, Gemini client and HTTP sessions; each session only owns its state.
+
+    python session_server.py --port 8080
+    curl -X POST localhost:8080/sessions
+    curl -X POST localhost:8080/sessions/<id>/messages -d '{"message": "moderate"}'
+    curl localhost:8080/metrics               # Prometheus text (run with TRAIL_BUDDY_METRICS=1)
+    python session_server.py --measure 1000   # per-session memory vs a full RootAgent
+"""
+import argparse
+import copy
+import json
+import logging
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from resilience import CallGuard
+
+
+class Session:
+    """One conversation: its forked agent, last activity time and a lock serialising its turns."""
+
+    __slots__ = ("agent", "last_seen", "lock")
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    def discard(self):
+        """Cancel the session's queued speculative descriptions, so a dropped session stops spending Gemini calls."""
+        if self.agent.description_prefetcher is not None:
+            self.agent.description_prefetcher.cancel()
+
+
+class SessionManager:
+    """Create, look up and evict conversations forked from one shared template RootAgent."""
+
+    def __init__(self, template, idle_timeout=1800, max_sessions=10000, prefetch_workers=8):
+        self.template = template
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> Session, least recently used first
+        self._lock = threading.Lock()
+
+        # All sessions' speculative descriptions run on one pool sized for the server, not per
+        # session, with a Gemini worker budget of their own so they can't starve interactive calls
+        if template.description_prefetcher is not None:
+            template.description_prefetcher.executor = ThreadPoolExecutor(
+                max_workers=prefetch_workers, thread_name_prefix="describe"
+            )
+            template.prefetch_guard = CallGuard(timeout=template.gemini_guard.timeout,
+                                                breaker=template.gemini_guard.breaker, max_workers=prefetch_workers)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self):
+        """Start a new conversation and return (session_id, greeting)."""
+        session_id = uuid.uuid4().hex
+        session = Session(self.template.fork())
+        with self._lock:
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)[1].discard()
+        return session_id, session.agent.handle_user_message("")
+
+    def handle(self, session_id, message):
+        """Run one turn of a conversation. Raises KeyError for unknown or evicted sessions."""
+        with self._lock:
+            session = self._sessions[session_id]
+            self._sessions.move_to_end(session_id)
+            session.last_seen = time.monotonic()
+        with session.lock:
+            return session.agent.handle_user_message(message)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.discard()
+        return True
+
+    def evict_idle(self):
+        """Drop sessions idle for longer than idle_timeout; returns how many were removed."""
+        cutoff = time.monotonic() - self.idle_timeout
+        removed = 0
+        with self._lock:
+            # Ordered by recency, so idle sessions are all at the front
+            while self._sessions:
+                session_id, session = next(iter(self._sessions.items()))
+                if session.last_seen > cutoff:
+                    break
+                del self._sessions[session_id]
+                session.discard()
+                removed += 1
+        return removed
+
+    def start_evictor(self, interval=60):
+        """Evict idle sessions every `interval` seconds on a daemon thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+        threading.Thread(target=run, name="session-evictor", daemon=True).start()
+
+
+def measure_memory(manager, n=1000, conversation=("moderate", "8")):
+    """
+    Bytes allocated per session (after a short conversation) versus building a complete
+    DataAgent + PlannerAgent + CommunicationAgent + RootAgent the way main.py does per process.
+    Speculative description prefetch is off for the measurement: it would send real Gemini
+    requests, and its in-flight futures would swamp the per-session state being measured.
+    """
+    from communicator_agent import CommunicationAgent
+    from data_agent import DataAgent
+    from planner_agent import PlannerAgent
+    from root_agent import RootAgent
+
+    template = copy.copy(manager.template)
+    template.description_prefetcher = None
+    manager = SessionManager(template, max_sessions=max(n, manager.max_sessions))
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    session_ids = []
+    for _ in range(n):
+        session_id, _ = manager.create()
+        for message in conversation:
+            manager.handle(session_id, message)
+        session_ids.append(session_id)
+    per_session = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename")) / n
+
+    before = tracemalloc.take_snapshot()
+    data_agent = DataAgent(template.data_agent.csv_path)
+    full_agent = RootAgent(PlannerAgent(data_agent), data_agent, CommunicationAgent(),
+                           client=template.client)
+    for message in conversation:
+        full_agent.handle_user_message(message)
+    per_full_agent = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+
+    for session_id in session_ids:
+        manager.close(session_id)
+    return {"sessions": n, "bytes_per_session": round(per_session),
+            "bytes_per_full_agent": per_full_agent,
+            "ratio": round(per_session / per_full_agent, 4) if per_full_agent else None}
+
+
+def make_handler(manager):
+    class Handler(BaseHTTPRequestHandler):
+        """
+        JSON API: POST /sessions, POST /sessions/<id>/messages, DELETE /sessions/<id>,
+        GET /stats (session count, weather cache and prefetch freshness).
+        GET /metrics serves Prometheus text and GET /metrics.json the JSON dump with recent turn traces.
+        """
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _parts(self):
+            return [p for p in self.path.split("?", 1)[0].split("/") if p]
+
+        def do_GET(self):
+            parts = self._parts()
+            if parts == ["stats"]:
+                stats = {"sessions": len(manager), "weather_cache": manager.template.data_agent.weather_cache.stats()}
+                if manager.template.weather_prefetcher is not None:
+                    stats["weather_prefetch"] = manager.template.weather_prefetcher.freshness()
+                return self._send(200, stats)
+            if parts == ["metrics"]:
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            if parts == ["metrics.json"]:
+                return self._send(200, metrics.snapshot())
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            parts = self._parts()
+            if parts == ["sessions"]:
+                session_id, reply = manager.create()
+                return self._send(201, {"session_id": session_id, "reply": reply})
+
+            if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "messages":
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    message = json.loads(self.rfile.read(length) or b"{}").get("message", "")
+                except ValueError:
+                    return self._send(400, {"error": "body must be JSON like {\"message\": \"...\"}"})
+                try:
+                    reply = manager.handle(parts[1], str(message))
+                except KeyError:
+                    return self._send(404, {"error": "unknown or expired session"})
+                return self._send(200, {"session_id": parts[1], "reply": reply})
+
+            self._send(404, {"error": "not found"})
+
+        def do_DELETE(self):
+            parts = self._parts()
+            if len(parts) == 2 and parts[0] == "sessions" and manager.close(parts[1]):
+                return self._send(200, {"closed": parts[1]})
+            self._send(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass  # Keep the console quiet under load
+
+    return Handler
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Serve many Trail Buddy conversations from one process.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--idle-timeout", type=int, default=1800, help="seconds before an idle session is dropped")
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--measure", type=int, metavar="N", help="report memory for N sessions and exit")
+    args = parser.parse_args()
+
+    from main import create_root_agent
+    template = create_root_agent()
+    template.planner_agent.warm_up()  # Query parser and name index ready before the first session's turn
+    manager = SessionManager(template, idle_timeout=args.idle_timeout, max_sessions=args.max_sessions)
+
+    if args.measure:
+        print(json.dumps(measure_memory(manager, args.measure), indent=2))
+        return
+
+    manager.start_evictor()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(manager))
+    print(f"Trail Buddy session server on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180  # ~111.2 km
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Vectorized great-circle distance in km from one point to arrays of points."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SpatialIndex:
+    """
+    Uniform lat/lng grid over a set of points, stored CSR-style: point ids sorted by
+    grid cell, so each row of cells in a query box is one contiguous slice found by bisection.
+    """
+
+    def __init__(self, lat, lng, cell_deg=0.1, ids=None, keys=None):
+        """ids/keys: the sorted layout from a previous build (e.g. a snapshot), to skip re-sorting."""
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.n_rows = int(math.floor(180 / cell_deg)) + 1
+        self.n_cols = int(math.floor(360 / cell_deg)) + 1
+
+        if ids is None or keys is None:
+            keys = self._row(self.lat) * self.n_cols + self._col(self.lng)
+            ids = np.argsort(keys, kind="stable")
+            keys = keys[ids]
+        self.ids = ids
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell_deg), 0, self.n_rows - 1).astype(np.int64)
+
+    def _col(self, lng):
+        return np.clip(np.floor((np.asarray(lng) + 180) / self.cell_deg), 0, self.n_cols - 1).astype(np.int64)
+
+    def _candidates(self, south, west, north, east):
+        """Ids of points in every grid cell touching the box (a superset of the exact answer)."""
+        if east - west >= 360:
+            west, east = -180, 180
+        # Split boxes that wrap the antimeridian into two column ranges
+        if west < -180:
+            col_ranges = [(west + 360, 180), (-180, east)]
+        elif east > 180:
+            col_ranges = [(west, 180), (-180, east - 360)]
+        else:
+            col_ranges = [(west, east)]
+
+        rows = np.arange(int(self._row(max(south, -90))), int(self._row(min(north, 90))) + 1, dtype=np.int64)
+        slices = []
+        for lo_lng, hi_lng in col_ranges:
+            lo = np.searchsorted(self.keys, rows * self.n_cols + self._col(lo_lng), side="left")
+            hi = np.searchsorted(self.keys, rows * self.n_cols + self._col(hi_lng), side="right")
+            slices.extend(self.ids[a:b] for a, b in zip(lo, hi) if b > a)
+
+        if not slices:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(slices)
+
+    # --- Queries ---
+    def within_bbox(self, south, west, north, east):
+        """Ids of points inside a lat/lng bounding box (west > east means it crosses the antimeridian)."""
+        if west > east:
+            east += 360
+        ids = self._candidates(south, west, north, east)
+        lat, lng = self.lat[ids], self.lng[ids]
+        lng = np.where(lng < west, lng + 360, lng)
+        return ids[(lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)]
+
+    def within_radius(self, lat, lng, radius_km):
+        """Ids and distances (km) of points within radius_km of (lat, lng), nearest first."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        south, north = lat - dlat, lat + dlat
+        angle = radius_km / EARTH_RADIUS_KM
+        if north >= 90 or south <= -90 or math.sin(angle) >= math.cos(math.radians(lat)):
+            west, east = -180, 180  # Circle reaches a pole, so it spans every longitude
+        else:
+            # Widest longitude extent of a spherical cap around (lat, lng)
+            dlng = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+            west, east = lng - dlng, lng + dlng
+
+        ids = self._candidates(south, west, north, east)
+        dist = haversine_km(lat, lng, self.lat[ids], self.lng[ids])
+        keep = dist <= radius_km
+        ids, dist = ids[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return ids[order], dist[order]
+
+    def nearest(self, lat, lng, k=5):
+        """Ids and distances (km) of the k points nearest to (lat, lng), nearest first."""
+        k = min(k, len(self))
+        radius = self.cell_deg * KM_PER_DEG_LAT
+        max_radius = math.pi * EARTH_RADIUS_KM
+        while True:
+            # Every point within radius is found exactly, so once k are inside it they are the true k nearest
+            ids, dist = self.within_radius(lat, lng, radius)
+            if len(ids) >= k or radius >= max_radius:
+                return ids[:k], dist[:k]
+            radius *= 2
@@ -1,12 +1,4 @@
 from communicator_agent import CommunicationAgent
-import os
-from dotenv import load_dotenv
-
-# --- Load .env ---
-load_dotenv(dotenv_path="./.env")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not set in .env")
 
 # --- Create communicator agent ---
 comm_agent = CommunicationAgent()
@@ -15,13 +7,13 @@ comm_agent = CommunicationAgent()
 lat = 54.5561  # e.g., Grasmoor
 lng = -3.3205
 
-# --- Fetch nearby pubs/cafes ---
-results = comm_agent.get_nearby_pubs_cafes(lat, lng, api_key=GEMINI_API_KEY)
+# --- Fetch nearby pubs/cafes (offline POI index if present, otherwise Overpass; no API key needed) ---
+results = comm_agent.get_nearby_pubs_cafes(lat, lng, place_type="pub")
 
 # --- Print results ---
 if results:
-    print("Nearby pubs and cafes:")
+    print("Nearby pubs:")
     for i, place in enumerate(results):
-        print(f"{i+1}. {place['name']} – {place['distance']} km – {place['description']}")
+        print(f"{i+1}. {place['name']} – {place['distance_km']} km")
 else:
-    print("No nearby pubs/cafes found.")
+    print("No nearby pubs found.")
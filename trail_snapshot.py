@@ -0,0 +1,212 @@
+"""
+Compiled, memory-mapped trail catalog snapshots.
+
+Layout: 8-byte magic, 4-byte header length, a JSON header (format version, source CSV
+signature, row count, categorical vocabularies, and the offset/dtype/length of every
+column), then each column's raw bytes aligned to 64 bytes. The spatial and name indexes
+are stored as columns too, so they are built once per CSV change rather than per process. Opening a snapshot maps the
+file and wraps the column bytes as NumPy arrays without copying or parsing anything.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+
+import numpy as np
+
+from spatial_index import SpatialIndex
+from trail_store import CategoricalColumn, StringColumn, TrailStore
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TRAILSNP"
+FORMAT_VERSION = 4
+ALIGN = 64
+
+NUMERIC_COLUMNS = ("distance", "lat", "lng", "height", "duration", "difficulty")
+STRING_COLUMNS = ("names", "views", "routes", "fell_heights", "durations")
+CATEGORICAL_COLUMNS = ("classifications", "regions", "starting_points", "suitable_for")
+
+
+def source_signature(csv_path, with_hash=True):
+    """mtime, size and (optionally) SHA-256 of the source CSV."""
+    stat = os.stat(csv_path)
+    signature = {"path": os.path.abspath(csv_path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(csv_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        signature["sha256"] = digest.hexdigest()
+    return signature
+
+
+def source_changed(source, csv_path, snapshot_path=None):
+    """
+    True if the CSV differs from the snapshot's recorded source (a touched but identical file is unchanged).
+    snapshot_path: the snapshot source came from; when a touched file hashes the same, its new mtime and
+    size are recorded there (and in source), so later checks are a stat again rather than a re-hash.
+    """
+    current = source_signature(csv_path, with_hash=False)
+    if current["mtime_ns"] == source["mtime_ns"] and current["size"] == source["size"]:
+        return False
+    current = source_signature(csv_path)
+    if current["sha256"] != source.get("sha256"):
+        return True
+    if snapshot_path is not None:
+        try:
+            update_source(snapshot_path, current)
+        except (ValueError, OSError) as e:
+            logger.warning("Could not record the source stat in %s: %s", snapshot_path, e)
+        else:
+            source.update(current)
+    return False
+
+
+def write_snapshot(store, path, source):
+    """Write store to path atomically (temp file + rename), so readers never see a partial file."""
+    arrays = {name: getattr(store, name) for name in NUMERIC_COLUMNS}
+    for name in STRING_COLUMNS:
+        column = getattr(store, name)
+        arrays[f"{name}.buffer"] = np.frombuffer(bytes(column.buffer), dtype=np.uint8)
+        arrays[f"{name}.offsets"] = column.offsets
+    for name in CATEGORICAL_COLUMNS:
+        arrays[f"{name}.codes"] = getattr(store, name).codes
+    arrays["spatial.ids"] = store.spatial.ids
+    arrays["spatial.keys"] = store.spatial.keys
+
+    header = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "source": source,
+        "rows": len(store),
+        "spatial_cell_deg": store.spatial.cell_deg,
+        "categories": {name: getattr(store, name).values for name in CATEGORICAL_COLUMNS},
+        "columns": {},
+    }
+
+    # Lay the columns out after the header, then write the header with the final offsets
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        header["columns"][name] = {"offset": offset, "dtype": array.dtype.str, "count": int(array.size)}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGN) * ALIGN
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header["columns"][name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def update_source(path, source):
+    """
+    Replace the source signature in a snapshot's header in place, leaving the columns as they are.
+    The header keeps its length (padded with spaces), so column offsets don't move; raises
+    ValueError if the new signature doesn't fit or is for different data (another SHA-256).
+    """
+    with open(path, "r+b") as f:
+        prefix = f.read(len(MAGIC) + 4)
+        if prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a trail snapshot")
+        (header_len,) = struct.unpack_from("<I", prefix, len(MAGIC))
+        header = json.loads(f.read(header_len))
+        if header["source"].get("sha256") != source.get("sha256"):
+            raise ValueError(f"{path} was built from different source data")
+        header["source"] = source
+        header_bytes = json.dumps(header).encode("utf-8")
+        if len(header_bytes) > header_len:
+            raise ValueError(f"{path}: new source signature doesn't fit in the header")
+        f.seek(len(MAGIC) + 4)
+        f.write(header_bytes.ljust(header_len))
+
+
+def open_snapshot(path):
+    """Map a snapshot file and return a TrailStore over it (no parsing or copying of column data)."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a trail snapshot")
+    (header_len,) = struct.unpack_from("<I", mapped, len(MAGIC))
+    header = json.loads(mapped[len(MAGIC) + 4:len(MAGIC) + 4 + header_len])
+    if header["version"] != FORMAT_VERSION or header["byteorder"] != sys.byteorder:
+        raise ValueError(f"{path} has an incompatible snapshot format")
+    data_start = -(-(len(MAGIC) + 4 + header_len) // ALIGN) * ALIGN
+
+    def column(name):
+        spec = header["columns"][name]
+        return np.frombuffer(mapped, dtype=np.dtype(spec["dtype"]), count=spec["count"],
+                             offset=data_start + spec["offset"])
+
+    columns = {name: column(name) for name in NUMERIC_COLUMNS}
+    for name in STRING_COLUMNS:
+        spec = header["columns"][f"{name}.buffer"]
+        start = data_start + spec["offset"]
+        buffer = memoryview(mapped)[start:start + spec["count"]]
+        columns[name] = StringColumn(buffer, column(f"{name}.offsets"))
+    for name in CATEGORICAL_COLUMNS:
+        values = [sys.intern(v) for v in header["categories"][name]]
+        columns[name] = CategoricalColumn(column(f"{name}.codes"), values)
+
+    spatial = SpatialIndex(columns["lat"], columns["lng"], cell_deg=header["spatial_cell_deg"],
+                           ids=column("spatial.ids"), keys=column("spatial.keys"))
+    return TrailStore.from_columns(spatial=spatial, source=header["source"], **columns)
+
+
+def load_snapshot(csv_path, snapshot_path, build):
+    """
+    Open the snapshot for csv_path, first (re)building it with build() -> TrailStore
+    when it is missing, unreadable, from another format version, or the CSV has changed.
+    """
+    if os.path.exists(snapshot_path):
+        try:
+            store = open_snapshot(snapshot_path)
+            if not source_changed(store.source, csv_path, snapshot_path):
+                return store
+        except (ValueError, KeyError, OSError):
+            pass  # Corrupt or old-format snapshot: rebuild below
+
+    source = source_signature(csv_path)
+    write_snapshot(build(), snapshot_path, source)
+    return open_snapshot(snapshot_path)
+
+
+class SnapshotWatcher:
+    """Poll the source CSV and hot-swap the planner onto a rebuilt snapshot when it changes."""
+
+    def __init__(self, planner_agent, interval=5):
+        self.planner_agent = planner_agent
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.planner_agent.reload_if_changed()
+            except Exception as e:
+                logger.warning("Catalog reload failed: %s", e)
@@ -0,0 +1,385 @@
+import heapq
+import sys
+from functools import cached_property
+import numpy as np
+from attribute_index import PartitionedIndex, PostingIndex, SortedIndex, intersect
+from name_index import NameIndex
+from spatial_index import SpatialIndex
+
+# Difficulty levels from easiest to hardest; a trail's difficulty code is its index here.
+DIFFICULTY_ORDER = ["very easy", "easy", "moderate", "hard", "very hard"]
+DIFFICULTY_CODES = {level: code for code, level in enumerate(DIFFICULTY_ORDER)}
+
+
+def _to_float(value):
+    """Parse a CSV number, returning NaN for blanks or junk."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class StringColumn:
+    """Free-text column packed into one UTF-8 buffer plus an offsets array; rows decode on access."""
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets  # len(column) + 1 int64 byte offsets into buffer
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.buffer[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+
+class CategoricalColumn:
+    """Low-cardinality column: small integer codes into a list of interned distinct values."""
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def from_strings(cls, strings, values=None):
+        """values: optional fixed vocabulary (codes follow its order); otherwise built from the data."""
+        lookup = {} if values is None else {v: code for code, v in enumerate(values)}
+        values = [] if values is None else list(values)
+        codes = []
+        for s in strings:
+            code = lookup.get(s)
+            if code is None:
+                code = lookup[s] = len(values)
+                values.append(sys.intern(s))
+            codes.append(code)
+        return cls(np.array(codes, dtype=np.int16 if len(values) < 2 ** 15 else np.int32), values)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+
+class TrailRecord:
+    """
+    Lightweight read-only view of one trail row (its id plus the store it lives in).
+    Supports the same key access as the old per-row dicts: trail["Trail"], trail.get("Views").
+    """
+
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, trail_id):
+        self.store = store
+        self.id = trail_id
+
+    def __getitem__(self, key):
+        return self.store.field(self.id, key)
+
+    def get(self, key, default=None):
+        try:
+            return self.store.field(self.id, key)
+        except KeyError:
+            return default
+
+    def keys(self):
+        return iter(TrailStore.FIELDS)
+
+    def __iter__(self):
+        return self.keys()
+
+    def items(self):
+        return ((key, self[key]) for key in TrailStore.FIELDS)
+
+    def __eq__(self, other):
+        return isinstance(other, TrailRecord) and other.store is self.store and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self.store), self.id))
+
+    def __repr__(self):
+        return f"TrailRecord({self.id}, {self['Trail']!r})"
+
+
+class TrailStore:
+    """
+    Columnar trail catalog: numeric columns as NumPy arrays, text packed into string columns and
+    categorical fields interned. Trails are addressed by integer id and scored in one batched pass.
+    """
+
+    # Keys of a trail row, in the order DataAgent.iter_trails produces them
+    FIELDS = ("Trail", "Difficulty", "Distance_km", "Lat", "Lng", "Duration_hours", "Views",
+              "Fell_Height", "Route", "Fell_Classification", "Region", "Starting_Point", "Suitable_For")
+
+    def __init__(self, records):
+        """records: iterable of trail row dicts (consumed once, e.g. streamed from the CSV)."""
+        columns = {key: [] for key in self.FIELDS}
+        for t in records:
+            for key in self.FIELDS:
+                columns[key].append(t.get(key, ""))
+
+        try:
+            difficulty = np.array([DIFFICULTY_CODES[d.lower()] for d in columns["Difficulty"]], dtype=np.int8)
+        except KeyError as e:
+            raise ValueError(f"Unknown trail difficulty: {e.args[0]!r}") from None
+
+        self._attach(
+            distance=np.array(columns["Distance_km"], dtype=np.float64),
+            lat=np.array(columns["Lat"], dtype=np.float64),
+            lng=np.array(columns["Lng"], dtype=np.float64),
+            height=np.array([_to_float(v) for v in columns["Fell_Height"]], dtype=np.float64),
+            duration=np.array([_to_float(v) for v in columns["Duration_hours"]], dtype=np.float64),
+            difficulty=difficulty,
+            names=StringColumn.from_strings(columns["Trail"]),
+            views=StringColumn.from_strings(columns["Views"]),
+            routes=StringColumn.from_strings(columns["Route"]),
+            fell_heights=StringColumn.from_strings(columns["Fell_Height"]),
+            durations=StringColumn.from_strings(columns["Duration_hours"]),
+            classifications=CategoricalColumn.from_strings(columns["Fell_Classification"]),
+            regions=CategoricalColumn.from_strings(columns["Region"]),
+            starting_points=CategoricalColumn.from_strings(columns["Starting_Point"]),
+            suitable_for=CategoricalColumn.from_strings(columns["Suitable_For"]),
+        )
+
+    @classmethod
+    def from_columns(cls, spatial=None, source=None, **columns):
+        """Build a store from ready-made columns (e.g. memory-mapped from a snapshot) without parsing."""
+        store = cls.__new__(cls)
+        store._attach(spatial=spatial, source=source, **columns)
+        return store
+
+    def _attach(self, distance, lat, lng, height, duration, difficulty, names, views, routes,
+                fell_heights, durations, classifications, regions, starting_points, suitable_for,
+                spatial=None, source=None):
+        self.distance = distance
+        self.lat = lat
+        self.lng = lng
+        self.height = height
+        self.duration = duration
+        self.difficulty = difficulty
+        self.names = names
+        self.views = views
+        self.routes = routes
+        self.fell_heights = fell_heights
+        self.durations = durations
+        self.classifications = classifications
+        self.regions = regions
+        self.starting_points = starting_points
+        self.suitable_for = suitable_for
+        self.source = source  # Where the data came from (set for snapshot-backed stores)
+
+        self._getters = {
+            "Trail": self.names.__getitem__,
+            "Difficulty": lambda i: DIFFICULTY_ORDER[self.difficulty[i]],
+            "Distance_km": lambda i: float(self.distance[i]),
+            "Lat": lambda i: float(self.lat[i]),
+            "Lng": lambda i: float(self.lng[i]),
+            "Duration_hours": self.durations.__getitem__,
+            "Views": self.views.__getitem__,
+            "Fell_Height": self.fell_heights.__getitem__,
+            "Route": self.routes.__getitem__,
+            "Fell_Classification": self.classifications.__getitem__,
+            "Region": self.regions.__getitem__,
+            "Starting_Point": self.starting_points.__getitem__,
+            "Suitable_For": self.suitable_for.__getitem__,
+        }
+
+        self.spatial = spatial if spatial is not None else SpatialIndex(self.lat, self.lng)
+
+    def __len__(self):
+        return len(self.distance)
+
+    def __getitem__(self, trail_id):
+        """The trail with this id, as a TrailRecord."""
+        if not 0 <= trail_id < len(self):
+            raise IndexError(trail_id)
+        return TrailRecord(self, int(trail_id))
+
+    def __iter__(self):
+        return (TrailRecord(self, i) for i in range(len(self)))
+
+    def field(self, trail_id, key):
+        """One field of one trail; raises KeyError for unknown field names."""
+        return self._getters[key](trail_id)
+
+    # --- Attribute filters ---
+    @cached_property
+    def attribute_indexes(self):
+        """Posting-list indexes for the categorical columns, built on the first filtered query."""
+        return {
+            "region": PostingIndex(self.regions),
+            "classification": PostingIndex(self.classifications, separator="/"),
+            "suitable_for": PostingIndex(self.suitable_for, separator="/"),
+            "starting_point": PostingIndex(self.starting_points),
+        }
+
+    @cached_property
+    def name_index(self):
+        """Exact, prefix and fuzzy trail-name lookup, built on first use (PlannerAgent.warm_up builds it ahead of time)."""
+        return NameIndex(self.names[i] for i in range(len(self)))
+
+    @cached_property
+    def duration_index(self):
+        return SortedIndex(self.duration)
+
+    def filter(self, region=None, classification=None, suitable_for=None, starting_point=None,
+               min_duration=None, max_duration=None):
+        """
+        Ascending ids of trails matching every given criterion, found by intersecting index
+        lookups rather than scanning rows. Text criteria match case-insensitively, exactly or
+        by substring; classification and suitable_for match any one of a trail's "/"-separated tags.
+        Returns None when no criterion is given (i.e. no restriction).
+        """
+        terms = {"region": region, "classification": classification,
+                 "suitable_for": suitable_for, "starting_point": starting_point}
+        id_lists = [self.attribute_indexes[name].lookup(term) for name, term in terms.items() if term]
+        if min_duration is not None or max_duration is not None:
+            id_lists.append(self.duration_index.between(min_duration, max_duration))
+        if not id_lists:
+            return None
+        return intersect(id_lists)
+
+    # --- Scoring ---
+    @staticmethod
+    def _difficulty_code(desired_difficulty, max_distance):
+        desired = DIFFICULTY_CODES.get(desired_difficulty.lower())
+        if desired is None:
+            raise ValueError(f"Unknown difficulty: {desired_difficulty!r}")
+        if max_distance <= 0:
+            raise ValueError("max_distance must be positive.")
+        return desired
+
+    @staticmethod
+    def _band_scores(desired):
+        """Score contribution of each difficulty code: exact = 1, one level off = 0.5, else 0."""
+        gap = np.abs(np.arange(len(DIFFICULTY_ORDER)) - desired)
+        return np.where(gap == 0, 1.0, np.where(gap == 1, 0.5, 0.0))
+
+    def score(self, desired_difficulty, max_distance, ids=None):
+        """
+        Score trails against the desired difficulty and max distance.
+        Same rules as the old per-row scorer: exact difficulty = 1, one level off = 0.5,
+        plus distance / max_distance when within range, or -0.5 when over it.
+        ids: optional array of trail ids to score instead of the whole catalog.
+        """
+        desired = self._difficulty_code(desired_difficulty, max_distance)
+        codes = self.difficulty if ids is None else self.difficulty[ids]
+        distance = self.distance if ids is None else self.distance[ids]
+
+        # Per-difficulty score lookup table, gathered by code instead of compared row by row
+        score = self._band_scores(desired)[codes]
+        score += np.where(distance <= max_distance, distance / max_distance, -0.5)
+        return score
+
+    def rank(self, desired_difficulty, max_distance, ids=None, limit=None, rng=None):
+        """
+        Return ids of positive-scoring trails, best first, with ties broken randomly.
+        limit: only the top `limit` ids are selected and sorted. Over the whole catalog this is
+            answered from the difficulty/distance index by top_k(); over a subset of ids by a
+            partial selection.
+        """
+        rng = rng or np.random.default_rng()
+        if ids is None and limit is not None:
+            return self.top_k(desired_difficulty, max_distance, limit, rng=rng)
+        ids = np.arange(len(self)) if ids is None else np.asarray(ids, dtype=np.intp)
+
+        score = self.score(desired_difficulty, max_distance, ids)
+        keep = score > 0
+        ids, score = ids[keep], score[keep]
+
+        if limit is not None and limit < len(ids):
+            # Everything strictly above the k-th best score is in; fill the rest from its tie group at random
+            kth = np.partition(score, len(score) - limit)[len(score) - limit]
+            above = np.flatnonzero(score > kth)
+            tied = np.flatnonzero(score == kth)
+            picked = np.concatenate([above, rng.choice(tied, limit - len(above), replace=False)])
+            ids, score = ids[picked], score[picked]
+
+        # Sort by score descending; a random secondary key shuffles each tie group
+        order = np.lexsort((rng.random(len(score)), -score))
+        return ids[order]
+
+    @cached_property
+    def difficulty_index(self):
+        """Trail ids partitioned by difficulty code, each partition sorted by distance."""
+        return PartitionedIndex(self.difficulty, self.distance, len(DIFFICULTY_ORDER))
+
+    def top_k(self, desired_difficulty, max_distance, k, rng=None):
+        """
+        The k best-scoring trail ids, best first, with ties broken randomly - the same result as
+        rank(limit=k) without scoring every trail.
+
+        Within one difficulty band, trails up to max_distance score band + distance / max_distance,
+        so walking the band's distance-sorted partition backwards from bisect(max_distance)
+        yields them best first; the exact band's over-distance trails all score 0.5. The bands
+        are heap-merged as runs of equal distance, so cost is O(log n + k) plus the size of the
+        tie group at the cut-off, which is sampled from rather than sorted.
+        """
+        rng = rng or np.random.default_rng()
+        desired = self._difficulty_code(desired_difficulty, max_distance)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        band_scores = self._band_scores(desired)
+
+        streams = []
+        for code, band in enumerate(band_scores.tolist()):
+            ids, distance = self.difficulty_index.partition(code)
+            within = int(np.searchsorted(distance, max_distance, side="right"))
+            # Zero-band trails need a positive distance to score above 0
+            low = int(np.searchsorted(distance, 0.0, side="right")) if band == 0 else 0
+            streams.append(self._score_runs(ids, distance, low, within, band, max_distance, len(streams)))
+            if code == desired and within < len(ids):
+                streams.append(iter([(-(band - 0.5), len(streams), ids[within:])]))
+
+        # Take whole runs best first until k are covered, plus every run tied with the last one
+        runs, count = [], 0
+        for negative_score, _, run in heapq.merge(*streams):
+            if count >= k and negative_score != runs[-1][0]:
+                break
+            runs.append((negative_score, run))
+            count += len(run)
+
+        taken = runs
+        if count > k:
+            # Keep everything above the cut-off score; fill the rest with a random sample of its tie group
+            cutoff = runs[-1][0]
+            taken = [(s, run) for s, run in runs if s != cutoff]
+            tied = [run for s, run in runs if s == cutoff]
+            sizes = np.array([len(run) for run in tied])
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+            picks = rng.choice(int(sizes.sum()), k - sum(len(run) for _, run in taken), replace=False)
+            which = np.searchsorted(starts, picks, side="right") - 1
+            taken.append((cutoff, np.array([tied[w][p - starts[w]] for w, p in zip(which, picks)], dtype=np.intp)))
+
+        if not taken:
+            return np.empty(0, dtype=np.intp)
+        ids = np.concatenate([run for _, run in taken]).astype(np.intp, copy=False)
+        score = np.concatenate([np.full(len(run), -s) for s, run in taken])
+        order = np.lexsort((rng.random(len(score)), -score))
+        return ids[order]
+
+    @staticmethod
+    def _score_runs(ids, distance, low, high, band, max_distance, stream):
+        """(-score, stream, ids) for each run of equal distance in distance[low:high], longest first."""
+        while high > low:
+            d = distance[high - 1]
+            start = low + int(np.searchsorted(distance[low:high], d, side="left"))
+            yield -(band + d / max_distance), stream, ids[start:high]
+            high = start
+
+    def closest_by_distance(self, max_distance, k=5, ids=None):
+        """Ids of the k trails (among ids, if given) whose length is closest to max_distance."""
+        ids = np.arange(len(self)) if ids is None else np.asarray(ids, dtype=np.intp)
+        gap = np.abs(self.distance[ids] - max_distance)
+        if k < len(gap):
+            top = np.argpartition(gap, k)[:k]
+        else:
+            top = np.arange(len(gap))
+        return ids[top[np.argsort(gap[top], kind="stable")]]
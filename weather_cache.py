@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+
+
+class WeatherCache:
+    """
+    Weather cache keyed on coordinates snapped to a grid.
+    Fresh entries (younger than ttl) are served directly; stale ones (up to ttl + stale_ttl)
+    are served immediately while a background refresh runs; concurrent lookups for the
+    same cell share one upstream call.
+    """
+
+    def __init__(self, fetch, grid_deg=0.05, ttl=600, stale_ttl=3600, max_entries=10000, max_workers=4):
+        self.fetch = fetch  # fetch(lat, lon) -> weather dict, called with snapped coordinates
+        self.grid_deg = grid_deg
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        self._entries = {}  # key -> (weather, fetched_at)
+        self._inflight = {}  # key -> Future of the running upstream call
+        self._async_inflight = {}  # key -> asyncio Task of the running async upstream call
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weather")
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def snap(self, lat, lon):
+        """Snap coordinates to the centre-point grid used as the cache key."""
+        g = self.grid_deg
+        return round(round(lat / g) * g, 6), round(round(lon / g) * g, 6)
+
+    def cells(self, lat, lon):
+        """Distinct snapped keys covering coordinate arrays, sorted; same keys as snap() for each point."""
+        g = self.grid_deg
+        points = np.column_stack((lat, lon))
+        points = points[~np.isnan(points).any(axis=1)]
+        # Dedupe on integer grid indexes, then snap each distinct cell exactly as snap() does
+        cells = np.unique(np.round(points / g), axis=0)
+        return [(round(i * g, 6), round(j * g, 6)) for i, j in cells.tolist()]
+
+    def reserve(self, n):
+        """Grow max_entries to hold at least n cells, so a bulk refresh does not evict its own entries."""
+        with self._lock:
+            self.max_entries = max(self.max_entries, n)
+
+    def get(self, lat, lon, timeout=None):
+        """
+        Weather for (lat, lon). Blocks only on a cold miss, for at most `timeout` seconds
+        (raises concurrent.futures.TimeoutError), or re-raises the upstream error.
+        """
+        key = self.snap(lat, lon)
+        with self._lock:
+            status, weather = self._lookup(key)
+            if status == "fresh":
+                return weather
+            future = self._refresh(key)
+            if status == "stale":
+                return weather
+        return future.result(timeout=timeout)
+
+    async def get_async(self, lat, lon, fetch_async, timeout=None):
+        """
+        Async version of get(): fetch_async(lat, lon) is awaited on the running event loop,
+        and concurrent coroutines asking for the same cell await one shared task.
+        Raises asyncio.TimeoutError if a cold miss takes longer than timeout.
+        """
+        key = self.snap(lat, lon)
+        with self._lock:
+            status, weather = self._lookup(key)
+        if status == "fresh":
+            return weather
+        task = self._async_inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._load_async(key, fetch_async))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())  # Mark errors as handled
+            self._async_inflight[key] = task
+        if status == "stale":
+            return weather
+        # shield: a caller timing out must not cancel the fetch other callers are waiting on
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def put(self, lat, lon, weather, fetched_at=None):
+        """Store weather fetched elsewhere (e.g. a bulk request) under its snapped key."""
+        with self._lock:
+            self._store(self.snap(lat, lon), weather, fetched_at or time.time())
+
+    def age(self, lat, lon):
+        """Seconds since the cached weather for (lat, lon) was fetched, or None if not cached."""
+        entry = self._entries.get(self.snap(lat, lon))
+        return None if entry is None else time.time() - entry[1]
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits,
+                "stale_hits": self.stale_hits, "misses": self.misses}
+
+    # --- Internals (call with the lock held) ---
+    def _lookup(self, key):
+        """Classify the cached entry for key as fresh, stale or miss, counting the outcome."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.time() - entry[1]
+            if age <= self.ttl:
+                self.hits += 1
+                metrics.count("weather_cache_total", result="fresh")
+                return "fresh", entry[0]
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                metrics.count("weather_cache_total", result="stale")
+                return "stale", entry[0]
+        self.misses += 1
+        metrics.count("weather_cache_total", result="miss")
+        return "miss", None
+
+    def _refresh(self, key):
+        """Start an upstream fetch for key unless one is already running; return its Future."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._executor.submit(self._load, key)
+            self._inflight[key] = future
+        return future
+
+    def _store(self, key, weather, fetched_at):
+        self._entries.pop(key, None)  # Re-insert so dict order tracks recency
+        self._entries[key] = (weather, fetched_at)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def _load(self, key):
+        try:
+            weather = self.fetch(*key)
+            with self._lock:
+                self._store(key, weather, time.time())
+            return weather
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def _load_async(self, key, fetch_async):
+        try:
+            weather = await fetch_async(*key)
+            with self._lock:
+                self._store(key, weather, time.time())
+            return weather
+        finally:
+            self._async_inflight.pop(key, None)
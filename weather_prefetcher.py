@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherPrefetcher:
+    """
+    Background refresher that pulls weather for every trail location (grid cells taken
+    from the planner's trail store) in a few bulk Open-Meteo requests and stores it in DataAgent's weather cache, so the weather
+    turn is normally a cache hit. Cache misses still fall back to DataAgent.get_weather.
+    """
+
+    def __init__(self, planner_agent, batch_size=100, interval=None):
+        self.planner_agent = planner_agent
+        self.data_agent = planner_agent.data_agent
+        self.batch_size = batch_size
+        # Default: refresh just before cached entries stop being fresh
+        self.interval = interval or self.data_agent.weather_cache.ttl * 0.9
+
+        self.last_refresh = None
+        self.last_duration = None
+        self.locations = 0
+        self.errors = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Fetch weather for all trail locations now (one request per batch of grid cells)."""
+        cache = self.data_agent.weather_cache
+        started = time.time()
+
+        # Trails in the same grid cell share one cached entry, so only fetch each cell once
+        store = self.planner_agent.store
+        cells = cache.cells(store.lat, store.lng)
+        # Headroom for on-demand lookups outside trail cells
+        cache.reserve(len(cells) + len(cells) // 10)
+
+        errors = 0
+        for i in range(0, len(cells), self.batch_size):
+            batch = cells[i:i + self.batch_size]
+            try:
+                results = self.data_agent.get_weather_bulk(batch)
+            except Exception as e:
+                logger.warning("Bulk weather error: %s", e)
+                errors += 1
+                continue
+            for (lat, lon), weather in zip(batch, results):
+                cache.put(lat, lon, weather, fetched_at=started)
+
+        self.locations = len(cells)
+        self.errors = errors
+        self.last_refresh = started
+        self.last_duration = time.time() - started
+        metrics.observe("weather_prefetch_seconds", self.last_duration)
+        metrics.count("weather_prefetch_locations_total", value=len(cells))
+        if errors:
+            metrics.count("weather_prefetch_errors_total", value=errors)
+
+    def freshness(self):
+        """Metadata about the last bulk refresh."""
+        return {
+            "last_refresh": self.last_refresh,
+            "age_s": None if self.last_refresh is None else time.time() - self.last_refresh,
+            "duration_s": self.last_duration,
+            "locations": self.locations,
+            "errors": self.errors,
+            "interval_s": self.interval,
+        }
+
+    # --- Scheduling ---
+    def start(self):
+        """Refresh immediately, then every `interval` seconds, on a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Weather prefetch failed: %s", e)
+            self._stop.wait(self.interval)